@@ -41,15 +41,23 @@ def check_cv2_face():
         print("   Fix: activate venv and run: pip install opencv-contrib-python==4.9.0.80")
         sys.exit(1)
 
+_model_cache = None  # (model mtime, recognizer, id_to_name), reused across in-process calls
+
 def load_model():
+    global _model_cache
     if not (os.path.exists(MODEL_PATH) and os.path.exists(LABELS_PATH)):
         print("❌ Model files missing. Train first: python train_lbph.py")
         sys.exit(1)
+    # Re-read only when the model was retrained since the last call
+    mtime = os.path.getmtime(MODEL_PATH)
+    if _model_cache is not None and _model_cache[0] == mtime:
+        return _model_cache[1], _model_cache[2]
     with open(LABELS_PATH, "r") as f:
         name_to_id = json.load(f)
     id_to_name = {v: k for k, v in name_to_id.items()}
     recog = cv2.face.LBPHFaceRecognizer_create()
     recog.read(MODEL_PATH)
+    _model_cache = (mtime, recog, id_to_name)
     return recog, id_to_name
 
 def preprocess(gray, box):
@@ -65,8 +73,8 @@ def largest_face(faces):
     if len(faces)==0: return None
     return max(faces, key=lambda b: b[2]*b[3])
 
-def run_once_json(timeout_s=12, show_window=False):
-    """Show window if requested; print one JSON line {name, distance} and exit."""
+def run_once(timeout=12, show=False):
+    """Recognize one face and return {name, distance}; name is None on timeout or cancel."""
     check_cv2_face()
     recognizer, id_to_name = load_model()
 
@@ -104,28 +112,34 @@ def run_once_json(timeout_s=12, show_window=False):
                             stable_count = 1
 
                         if stable_count >= STABLE_FRAMES:
-                            print(json.dumps({"name": name, "distance": float(distance)}))
-                            sys.exit(0)
+                            return {"name": name, "distance": float(distance)}
                     else:
                         stable_name = None
                         stable_count = 0
 
-            if show_window:
+            if show:
                 # Minimal overlay text; 'q' cancels
                 cv2.putText(frame, "Face Login…", (10,30), FONT, 0.9, (0,255,255), 2, cv2.LINE_AA)
                 cv2.imshow("Face Login", frame)
                 if cv2.waitKey(1) & 0xFF == ord('q'):
-                    print(json.dumps({"name": None}))
-                    sys.exit(3)
+                    return {"name": None, "reason": "cancelled"}
 
-            if time.time() - t0 > timeout_s:
-                print(json.dumps({"name": None}))
-                sys.exit(2)
+            if time.time() - t0 > timeout:
+                return {"name": None, "reason": "timeout"}
     finally:
+        # close() too: in-process callers (login retries) need the camera released, not just stopped
         cam.stop()
-        if show_window:
+        cam.close()
+        if show:
             cv2.destroyAllWindows()
 
+def run_once_json(timeout_s=12, show_window=False):
+    """Show window if requested; print one JSON line {name, distance} and exit."""
+    result = run_once(timeout=timeout_s, show=show_window)
+    reason = result.pop("reason", None)
+    print(json.dumps(result))
+    sys.exit({"timeout": 2, "cancelled": 3}.get(reason, 0))
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--once", action="store_true", help="Exit after confident recognition")
@@ -124,10 +124,12 @@ class LessonManager:
                 lesson_type.capitalize()
             )
             
-            if not os.path.isdir(folder):
+            try:
+                with os.scandir(folder) as it:
+                    files = [e.name for e in it if e.is_file() and e.name.endswith(".json")]
+            except (FileNotFoundError, NotADirectoryError):
                 return None
             
-            files = [f for f in os.listdir(folder) if f.endswith(".json")]
             if not files:
                 return None
             
@@ -557,7 +559,9 @@ class LingoApp:
         messages.extend(student_manager.conversation_history[-4:])
         messages.append({"role": "user", "content": "\n".join(context)})
         
-        try:
+        # Try the primary key, then once more with the backup; messages are reused as-is
+        error = None
+        for attempt in range(2):
             try:
                 response = api_manager.client.chat.completions.create(
                     model=api_manager.current_model,
@@ -570,14 +574,17 @@ class LingoApp:
                 return reply
 
             except Exception as e:
-                if "invalid_api_key" in str(e).lower() or "unauthorized" in str(e).lower():
-                    api_manager.switch_to_backup()
-                    return self.ask_lingo(question)  # retry with backup
+                error = e
+                if attempt == 0 and ("invalid_api_key" in str(e).lower() or "unauthorized" in str(e).lower()):
+                    try:
+                        api_manager.switch_to_backup()
+                    except Exception as switch_error:
+                        error = switch_error
+                        break
+                    continue  # retry with backup
+                break
 
-                return f"I'm having trouble thinking right now. Could you try asking again? ({str(e)})"
-            
-        except Exception as e:
-            return f"I'm having trouble thinking right now. Could you try asking again? ({str(e)})"
+        return f"I'm having trouble thinking right now. Could you try asking again? ({str(error)})"
     
     def display_user_message(self, message):
         self.lesson_content.configure(state='normal')
@@ -1,7 +1,10 @@
 import os
 import json
 import random
+import hashlib
 from tinydb import TinyDB, Query
+from tinydb.storages import JSONStorage
+from tinydb.middlewares import CachingMiddleware
 from tkinter import messagebox
 from datetime import datetime
 import re
@@ -25,9 +28,16 @@ class LessonManager:
 
     def __init__(self, llm_handler=None, lessons_root="/home/robinglory/Desktop/Thesis/english_lessons"):
         self.llm = llm_handler  # For the new LLM integration
-        self.lessons_db = TinyDB('lessons_progress.json')
-        self.conversation_db = TinyDB('conversations.json')
+        # Cache the JSON in memory so searches don't re-parse the file every call
+        self.lessons_db = TinyDB('lessons_progress.json', storage=CachingMiddleware(JSONStorage))
+        self._conv_path = 'conversations.jsonl'  # append-only log, one JSON record per line
         self.lessons_root = lessons_root
+        self._completed_hashes = {}  # (user, lesson_type) -> set of filepath digests
+
+    @staticmethod
+    def _path_digest(filepath):
+        """Short fixed-size digest of a lesson path, used for completed-lesson lookups"""
+        return hashlib.blake2b(filepath.encode("utf-8"), digest_size=8).digest()
 
     def get_lesson_by_type(self, user_level, lesson_type, current_user):
         try:
@@ -38,26 +48,31 @@ class LessonManager:
                 lesson_type.capitalize()
             )
             
-            if not os.path.isdir(folder):
+            try:
+                with os.scandir(folder) as it:
+                    files = sorted(e.name for e in it if e.is_file() and e.name.endswith(".json"))
+            except (FileNotFoundError, NotADirectoryError):
                 messagebox.showerror("Error", f"Directory not found: {folder}")
                 return None
             
-            files = sorted([f for f in os.listdir(folder) if f.endswith(".json")])
             if not files:
                 messagebox.showerror("Error", f"No lesson files found in {folder}")
                 return None
             
-            Lesson = Query()
-            user_lessons = self.lessons_db.search(
-                (Lesson.user == current_user['name']) & 
-                (Lesson.lesson_type == lesson_type)
-            )
-            
-            completed_lessons = [l['filepath'] for l in user_lessons]
+            key = (current_user['name'], lesson_type)
+            completed_lessons = self._completed_hashes.get(key)
+            if completed_lessons is None:
+                Lesson = Query()
+                user_lessons = self.lessons_db.search(
+                    (Lesson.user == current_user['name']) & 
+                    (Lesson.lesson_type == lesson_type)
+                )
+                completed_lessons = {self._path_digest(l['filepath']) for l in user_lessons}
+                self._completed_hashes[key] = completed_lessons
             
             for file in files:
                 filepath = os.path.join(folder, file)
-                if filepath not in completed_lessons:
+                if self._path_digest(filepath) not in completed_lessons:
                     with open(filepath, "r", encoding="utf-8") as f:
                         lesson = json.load(f)
                         lesson['filepath'] = filepath
@@ -104,14 +119,20 @@ class LessonManager:
             'title': lesson_data.get('title', ''),
             'completed_at': datetime.now().isoformat()
         })
+        self.lessons_db.storage.flush()
+        completed_lessons = self._completed_hashes.get((user_name, lesson_data['type']))
+        if completed_lessons is not None:
+            completed_lessons.add(self._path_digest(lesson_data['filepath']))
 
     def save_conversation(self, user_name, lesson_type, conversation):
-        self.conversation_db.insert({
+        record = {
             'user': user_name,
             'lesson_type': lesson_type,
             'conversation': conversation,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        with open(self._conv_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
     import re
 
@@ -7,232 +7,347 @@ from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
 from reportlab.lib.units import cm, mm
 from reportlab.lib import colors
 import os
+import re
+import gc
 import json
+import shutil
+import hashlib
+import bisect
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from reportlab import rl_config
+from reportlab import Version as _RL_VERSION
+from reportlab.pdfbase import pdfmetrics
+try:
+    import orjson  # optional: faster lesson parsing
+except ImportError:
+    orjson = None
+
+# Skip ReportLab's per-attribute validation unless we are debugging layout issues
+if not os.environ.get("LINGO_DEBUG"):
+    rl_config.shapeChecking = 0
+rl_config.warnOnMissingFontGlyphs = 0
+
+# Register the only fonts the textbook uses once, at import, rather than lazily mid-build
+for _font in ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique'):
+    pdfmetrics.getFont(_font)
+
+_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "lingo")
+_LOGO_PATH = os.path.join(os.path.dirname(__file__), "logo.png")
+
+def _load_json(filepath):
+    """Read one lesson JSON file, using orjson when it is installed"""
+    if orjson is not None:
+        with open(filepath, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+_ESC = re.compile(r'[&<>]')
+_ESC_MAP = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+
+@functools.lru_cache(maxsize=4096)
+def esc(text):
+    """Escape lesson text for ReportLab's paragraph markup"""
+    return _ESC.sub(lambda m: _ESC_MAP[m.group()], text)
 
 class LevelTrackingDocTemplate(BaseDocTemplate):
     def __init__(self, filename, **kwargs):
         super().__init__(filename, **kwargs)
         self.level_pages = {}  # map page_num -> level name
         self.current_level = None
+        # Same mapping as level_pages, kept sorted by page for bisect lookups
+        self._sorted_keys = []
+        self._sorted_levels = []
+        self._last_lookup = (None, None)  # (page_num, level) of the previous call
 
     def afterFlowable(self, flowable):
         if hasattr(flowable, 'level_name'):
             self.current_level = flowable.level_name
             self.level_pages[self.page] = self.current_level
+            i = bisect.bisect_left(self._sorted_keys, self.page)
+            if i < len(self._sorted_keys) and self._sorted_keys[i] == self.page:
+                self._sorted_levels[i] = self.current_level
+            else:
+                self._sorted_keys.insert(i, self.page)
+                self._sorted_levels.insert(i, self.current_level)
+            self._last_lookup = (None, None)
+        # Headings tagged with toc_level are reported to the TOC with their real page
+        toc_level = getattr(flowable, 'toc_level', None)
+        if toc_level is not None:
+            self.notify('TOCEntry', (toc_level, flowable.getPlainText(), self.page))
 
     def get_level_for_page(self, page_num):
-        keys = sorted(self.level_pages.keys())
-        level = None
-        for k in keys:
-            if page_num >= k:
-                level = self.level_pages[k]
-            else:
-                break
+        last_page, last_level = self._last_lookup
+        if page_num == last_page:
+            return last_level
+        i = bisect.bisect_right(self._sorted_keys, page_num) - 1
+        level = self._sorted_levels[i] if i >= 0 else None
+        self._last_lookup = (page_num, level)
         return level
 
+# Palette as hex strings so it can be used as a cache key
+_PALETTE = ('#2C3E50', '#E74C3C', '#3498DB', '#ECF0F1', '#7F8C8D')
+
+_COPYRIGHT_STYLE = ParagraphStyle(name='Copyright', fontSize=10, alignment=TA_CENTER)
+
+@functools.lru_cache(maxsize=1)
+def _build_styles(palette):
+    """Build the Lingo stylesheet and TOC level styles once per palette"""
+    primary_color, secondary_color, accent_color, light_gray, dark_gray = (
+        colors.HexColor(c) for c in palette)
+
+    # Get default styles
+    styles = getSampleStyleSheet()
+
+    # Create custom styles without name conflicts
+    # Title Page Styles
+    styles.add(ParagraphStyle(
+        name='LingoTitle',
+        parent=styles['Title'],
+        fontSize=28,
+        leading=32,
+        alignment=TA_CENTER,
+        spaceAfter=18,
+        textColor=primary_color,
+        fontName='Helvetica-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoSubtitle',
+        parent=styles['BodyText'],
+        fontSize=16,
+        leading=20,
+        alignment=TA_CENTER,
+        spaceAfter=40,
+        textColor=dark_gray,
+        fontName='Helvetica'
+    ))
+
+    # Header Styles
+    styles.add(ParagraphStyle(
+        name='LingoLevelHeading',
+        parent=styles['Heading1'],
+        fontSize=20,
+        leading=24,
+        alignment=TA_CENTER,
+        spaceAfter=12,
+        spaceBefore=12,
+        textColor=primary_color,
+        fontName='Helvetica-Bold',
+        borderWidth=1,
+        borderColor=primary_color,
+        borderPadding=(5, 5, 5, 5),
+        backColor=light_gray
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoLessonHeading',
+        parent=styles['Heading2'],
+        fontSize=18,
+        leading=22,
+        alignment=TA_CENTER,
+        spaceAfter=12,
+        spaceBefore=12,
+        textColor=secondary_color,
+        fontName='Helvetica-Bold',
+        underlineWidth=1,
+        underlineOffset=-4,
+        underlineColor=secondary_color
+    ))
+
+    # Content Styles
+    styles.add(ParagraphStyle(
+        name='LingoHeading2',
+        parent=styles['Heading2'],
+        fontSize=16,
+        leading=20,
+        alignment=TA_LEFT,
+        spaceBefore=12,
+        spaceAfter=8,
+        textColor=primary_color,
+        fontName='Helvetica-Bold',
+        leftIndent=10
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoBodyText',
+        parent=styles['BodyText'],
+        fontSize=12,
+        leading=16,
+        alignment=TA_JUSTIFY,
+        spaceAfter=8,
+        textColor=colors.black,
+        fontName='Helvetica',
+        firstLineIndent=12
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoExample',
+        parent=styles['BodyText'],
+        fontSize=11,
+        leading=15,
+        leftIndent=20,
+        spaceAfter=6,
+        textColor=accent_color,
+        fontName='Helvetica',  # Base font name
+        italic=True,           # Add italic property separately
+        backColor=light_gray,
+        borderWidth=0.5,
+        borderColor=accent_color,
+        borderPadding=(5, 5, 5, 5)
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoVocabulary',
+        parent=styles['BodyText'],
+        fontSize=12,
+        leading=16,
+        leftIndent=10,
+        spaceAfter=4,
+        textColor=colors.black,
+        fontName='Helvetica-Bold'
+    ))
+
+    styles.add(ParagraphStyle(
+        name='LingoFooter',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=dark_gray,
+        fontName='Helvetica-Oblique'
+    ))
+
+    # Table of Contents styles
+    toc_level_styles = [
+        ParagraphStyle(
+            name='LingoTOCLevel1',
+            parent=styles['Heading1'],
+            fontSize=14,
+            leftIndent=20,
+            firstLineIndent=-20,
+            spaceBefore=5,
+            leading=18,
+            textColor=primary_color,
+            fontName='Helvetica-Bold'
+        ),
+        ParagraphStyle(
+            name='LingoTOCLevel2',
+            parent=styles['Heading2'],
+            fontSize=12,
+            leftIndent=40,
+            firstLineIndent=-20,
+            spaceBefore=3,
+            leading=16,
+            textColor=secondary_color,
+            fontName='Helvetica'
+        ),
+        ParagraphStyle(
+            name='LingoTOCLevel3',
+            parent=styles['Normal'],
+            fontSize=11,
+            leftIndent=60,
+            firstLineIndent=-20,
+            spaceBefore=2,
+            leading=14,
+            textColor=dark_gray,
+            fontName='Helvetica'
+        ),
+    ]
+
+    return styles, toc_level_styles
+
+
 class PDFTextbook:
+    _HEADER_TITLE = "Lingo - AI Language Learning Textbook"
+
     def __init__(self, output_path, lessons_root):
         self.output_path = output_path
         self.lessons_root = lessons_root
         self.width, self.height = A4
 
         # Custom color palette
-        self.primary_color = colors.HexColor('#2C3E50')  # Dark blue
-        self.secondary_color = colors.HexColor('#E74C3C')  # Red
-        self.accent_color = colors.HexColor('#3498DB')  # Blue
-        self.light_gray = colors.HexColor('#ECF0F1')
-        self.dark_gray = colors.HexColor('#7F8C8D')
-
-        # Get default styles
-        self.styles = getSampleStyleSheet()
-
-        # Create custom styles without name conflicts
-        # Title Page Styles
-        self.styles.add(ParagraphStyle(
-            name='LingoTitle',
-            parent=self.styles['Title'],
-            fontSize=28,
-            leading=32,
-            alignment=TA_CENTER,
-            spaceAfter=18,
-            textColor=self.primary_color,
-            fontName='Helvetica-Bold'
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoSubtitle',
-            parent=self.styles['BodyText'],
-            fontSize=16,
-            leading=20,
-            alignment=TA_CENTER,
-            spaceAfter=40,
-            textColor=self.dark_gray,
-            fontName='Helvetica'
-        ))
-
-        # Header Styles
-        self.styles.add(ParagraphStyle(
-            name='LingoLevelHeading',
-            parent=self.styles['Heading1'],
-            fontSize=20,
-            leading=24,
-            alignment=TA_CENTER,
-            spaceAfter=12,
-            spaceBefore=12,
-            textColor=self.primary_color,
-            fontName='Helvetica-Bold',
-            borderWidth=1,
-            borderColor=self.primary_color,
-            borderPadding=(5, 5, 5, 5),
-            backColor=self.light_gray
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoLessonHeading',
-            parent=self.styles['Heading2'],
-            fontSize=18,
-            leading=22,
-            alignment=TA_CENTER,
-            spaceAfter=12,
-            spaceBefore=12,
-            textColor=self.secondary_color,
-            fontName='Helvetica-Bold',
-            underlineWidth=1,
-            underlineOffset=-4,
-            underlineColor=self.secondary_color
-        ))
-
-        # Content Styles
-        self.styles.add(ParagraphStyle(
-            name='LingoHeading2',
-            parent=self.styles['Heading2'],
-            fontSize=16,
-            leading=20,
-            alignment=TA_LEFT,
-            spaceBefore=12,
-            spaceAfter=8,
-            textColor=self.primary_color,
-            fontName='Helvetica-Bold',
-            leftIndent=10
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoBodyText',
-            parent=self.styles['BodyText'],
-            fontSize=12,
-            leading=16,
-            alignment=TA_JUSTIFY,
-            spaceAfter=8,
-            textColor=colors.black,
-            fontName='Helvetica',
-            firstLineIndent=12
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoExample',
-            parent=self.styles['BodyText'],
-            fontSize=11,
-            leading=15,
-            leftIndent=20,
-            spaceAfter=6,
-            textColor=self.accent_color,
-            fontName='Helvetica',  # Base font name
-            italic=True,           # Add italic property separately
-            backColor=self.light_gray,
-            borderWidth=0.5,
-            borderColor=self.accent_color,
-            borderPadding=(5, 5, 5, 5)
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoVocabulary',
-            parent=self.styles['BodyText'],
-            fontSize=12,
-            leading=16,
-            leftIndent=10,
-            spaceAfter=4,
-            textColor=colors.black,
-            fontName='Helvetica-Bold'
-        ))
-
-        self.styles.add(ParagraphStyle(
-            name='LingoFooter',
-            parent=self.styles['Normal'],
-            fontSize=9,
-            alignment=TA_CENTER,
-            textColor=self.dark_gray,
-            fontName='Helvetica-Oblique'
-        ))
-
-        # Table of Contents styles
+        self.primary_color = colors.HexColor(_PALETTE[0])  # Dark blue
+        self.secondary_color = colors.HexColor(_PALETTE[1])  # Red
+        self.accent_color = colors.HexColor(_PALETTE[2])  # Blue
+        self.light_gray = colors.HexColor(_PALETTE[3])
+        self.dark_gray = colors.HexColor(_PALETTE[4])
+
+        # Spacer factories: a flowable keeps layout state (e.g. _postponed) from the pass
+        # that placed it, so every use in the story needs its own instance
+        self._sp_small = functools.partial(Spacer, 1, 0.2*cm)
+        self._sp_med = functools.partial(Spacer, 1, 0.3*cm)
+        self._sp_half = functools.partial(Spacer, 1, 0.5*cm)
+
+        # Styles are shared across instances; the TOC itself holds per-build entries
+        self.styles, toc_level_styles = _build_styles(_PALETTE)
         self.toc = TableOfContents()
-        self.toc.levelStyles = [
-            ParagraphStyle(
-                name='LingoTOCLevel1',
-                parent=self.styles['Heading1'],
-                fontSize=14,
-                leftIndent=20,
-                firstLineIndent=-20,
-                spaceBefore=5,
-                leading=18,
-                textColor=self.primary_color,
-                fontName='Helvetica-Bold'
-            ),
-            ParagraphStyle(
-                name='LingoTOCLevel2',
-                parent=self.styles['Heading2'],
-                fontSize=12,
-                leftIndent=40,
-                firstLineIndent=-20,
-                spaceBefore=3,
-                leading=16,
-                textColor=self.secondary_color,
-                fontName='Helvetica'
-            ),
-            ParagraphStyle(
-                name='LingoTOCLevel3',
-                parent=self.styles['Normal'],
-                fontSize=11,
-                leftIndent=60,
-                firstLineIndent=-20,
-                spaceBefore=2,
-                leading=14,
-                textColor=self.dark_gray,
-                fontName='Helvetica'
-            ),
-        ]
+        self.toc.levelStyles = toc_level_styles
+        self._hf_geom = None  # header/footer coordinates, filled in on the first page
+
+    def _source_key(self):
+        """Fingerprint of the lesson tree from file names, mtimes and sizes (no reads)"""
+        h = hashlib.blake2b(digest_size=16)
+        # The output also depends on this module (renderers, styles, palette), the logo and ReportLab
+        for path in (__file__, _LOGO_PATH):
+            try:
+                st = os.stat(path)
+                h.update(f"{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8"))
+            except OSError:
+                h.update(b"-\n")
+        h.update(_RL_VERSION.encode("utf-8"))
+        entries = []
+        for dirpath, _, filenames in os.walk(self.lessons_root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                st = os.stat(path)
+                entries.append((os.path.relpath(path, self.lessons_root), st.st_mtime_ns, st.st_size))
+        for relpath, mtime_ns, size in sorted(entries):
+            h.update(f"{relpath}\0{mtime_ns}\0{size}\n".encode("utf-8"))
+        return h.hexdigest()
 
     def header_footer(self, canvas, doc):
+        # Margins are fixed for the whole build, so the geometry is worked out on the first page only
+        geom = self._hf_geom
+        if geom is None:
+            left = doc.leftMargin
+            right = doc.width + doc.leftMargin
+            header_y = self.height - doc.topMargin
+            footer_y = doc.bottomMargin
+            geom = self._hf_geom = (left, right, header_y + 10, header_y + 15,
+                                    footer_y - 0.5, footer_y - 15,
+                                    self.width / 2, self.width - doc.rightMargin + 20)
+        left, right, header_line_y, header_text_y, footer_line_y, footer_text_y, center_x, page_x = geom
+
         canvas.saveState()
-        
-        # Header
+
+        # Both rules share one stroke state
         canvas.setStrokeColor(self.primary_color)
         canvas.setLineWidth(0.5)
-        canvas.line(doc.leftMargin, self.height - doc.topMargin + 10, 
-                   doc.width + doc.leftMargin, self.height - doc.topMargin + 10)
-        
+        canvas.line(left, header_line_y, right, header_line_y)
+        canvas.line(left, footer_line_y, right, footer_line_y)
+
+        # Header
         canvas.setFont('Helvetica-Bold', 10)
         canvas.setFillColor(self.primary_color)
-        canvas.drawString(doc.leftMargin, self.height - doc.topMargin + 15, 
-                         "Lingo - AI Language Learning Textbook")
-        
+        canvas.drawString(left, header_text_y, self._HEADER_TITLE)
+
         # Footer
         level = doc.get_level_for_page(doc.page) or "Pre-intermediate Level"
-        
-        canvas.setStrokeColor(self.primary_color)
-        canvas.setLineWidth(0.5)
-        canvas.line(doc.leftMargin, doc.bottomMargin - 0.5, 
-                   doc.width + doc.leftMargin, doc.bottomMargin - 0.5)
-        
         canvas.setFont('Helvetica', 9)
         canvas.setFillColor(self.dark_gray)
-        canvas.drawCentredString(self.width / 2, doc.bottomMargin - 15, level)
-        canvas.drawRightString(self.width - doc.rightMargin + 20, doc.bottomMargin - 15, 
-                              f"Page {doc.page}")
-        
+        canvas.drawCentredString(center_x, footer_text_y, level)
+        canvas.drawRightString(page_x, footer_text_y, f"Page {doc.page}")
+
         canvas.restoreState()
 
-    def create_pdf(self):
+    def create_pdf(self, force=False):
+        # Reuse the last build when no lesson file changed; force=True always re-renders
+        cached_path = os.path.join(_CACHE_DIR, f"textbook-{self._source_key()}.pdf")
+        if not force and os.path.isfile(cached_path):
+            shutil.copyfile(cached_path, self.output_path)
+            return
+
         doc = LevelTrackingDocTemplate(
             self.output_path,
             pagesize=A4,
@@ -264,9 +379,10 @@ class PDFTextbook:
         
         # Add a decorative element (you can replace with your logo)
         try:
-            logo_path = os.path.join(os.path.dirname(__file__), "logo.png")
+            logo_path = _LOGO_PATH
             if os.path.exists(logo_path):
-                logo = Image(logo_path, width=4*cm, height=4*cm)
+                # lazy=2: open the file only when drawn and drop the pixels afterwards
+                logo = Image(logo_path, width=4*cm, height=4*cm, lazy=2)
                 logo.hAlign = 'CENTER'
                 self.story.append(logo)
                 self.story.append(Spacer(1, 1*cm))
@@ -278,131 +394,211 @@ class PDFTextbook:
         self.story.append(Paragraph("Textbook for Pre-intermediate and Intermediate Levels", 
                                    self.styles['LingoSubtitle']))
         self.story.append(Spacer(1, 4*cm))
-        self.story.append(Paragraph("© 2025 Final Year Thesis (Mechatronic Engineering Department) ", 
-                                  ParagraphStyle(name='Copyright', fontSize=10, alignment=TA_CENTER)))
-        self.story.append(Paragraph("Yan Naing Kyaw Tint (Software) ", 
-                                  ParagraphStyle(name='Copyright', fontSize=10, alignment=TA_CENTER)))
-        self.story.append(Paragraph("Ngwe Thant Sin (Hardware) ", 
-                                  ParagraphStyle(name='Copyright', fontSize=10, alignment=TA_CENTER)))
+        self.story.append(Paragraph("© 2025 Final Year Thesis (Mechatronic Engineering Department) <br/>"
+                                    "Yan Naing Kyaw Tint (Software) <br/>"
+                                    "Ngwe Thant Sin (Hardware) ",
+                                    _COPYRIGHT_STYLE))
         self.story.append(PageBreak())
 
         # Table of Contents
         toc_title = Paragraph("Table of Contents", self.styles['LingoLevelHeading'])
         toc_title.level_name = "Table of Contents"
-        self.story.append(toc_title)
-        self.story.append(Spacer(1, 0.5*cm))
-        self.story.append(self.toc)
-        self.story.append(PageBreak())
+        self.story.extend((toc_title, self._sp_half(), self.toc, PageBreak()))
 
-        # Process each level folder
+        # Walk the lesson folders first so file reads can start before any layout work
+        plan = []  # [(level_name, [(lesson_type, [filepath, ...]), ...]), ...]
         for level_folder, level_name in [('A2 Level (Pre-Intermediate)', 'Pre-intermediate Level'),
                                        ('B1 Level (Intermediate)', 'Intermediate Level')]:
-            self.current_level_text = level_name
             level_path = os.path.join(self.lessons_root, level_folder)
-
-            # Level heading with improved design
-            level_heading = Paragraph(level_name, self.styles['LingoLevelHeading'])
-            level_heading.level_name = level_name
-            self.story.append(level_heading)
-            self.story.append(Spacer(1, 0.3*cm))
-
-            # Add to TOC
-            self.toc.addEntry(0, level_name, doc.page if hasattr(doc, 'page') else 0)
-
-            # Process lesson types
+            lesson_types = []
             for lesson_type in ['Grammar', 'Vocabulary', 'Reading']:
-                lesson_type_path = os.path.join(level_path, lesson_type)
-                if not os.path.isdir(lesson_type_path):
+                # One scandir pass: DirEntry carries the type and full path already
+                try:
+                    with os.scandir(os.path.join(level_path, lesson_type)) as it:
+                        entries = sorted((e for e in it if e.is_file() and e.name.endswith('.json')),
+                                         key=lambda e: e.name)
+                except (FileNotFoundError, NotADirectoryError):
                     continue
+                lesson_types.append((lesson_type, [e.path for e in entries]))
+            plan.append((level_name, lesson_types))
+
+        # Prefetch lesson JSON on a small pool; results are consumed in plan order
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = {
+                filepath: executor.submit(_load_json, filepath)
+                for _, lesson_types in plan
+                for _, filepaths in lesson_types
+                for filepath in filepaths
+            }
+
+            # Process each level folder
+            for level_name, lesson_types in plan:
+                self.current_level_text = level_name
+
+                # Level heading with improved design
+                level_heading = Paragraph(level_name, self.styles['LingoLevelHeading'])
+                level_heading.level_name = level_name
+                level_heading.toc_level = 0
+                self.story.extend((level_heading, self._sp_med()))
+
+                # Process lesson types
+                for lesson_type, filepaths in lesson_types:
+                    # Lesson type heading with improved design
+                    lesson_type_heading = Paragraph(lesson_type, self.styles['LingoHeading2'])
+                    lesson_type_heading._bookmarkName = f"{level_name}_{lesson_type}"
+                    lesson_type_heading.toc_level = 1
+                    self.story.append(lesson_type_heading)
+
+                    for filepath in filepaths:
+                        print(f"Loading: {filepath}")
+                        lesson = futures[filepath].result()
+                        self.add_lesson(lesson)
+                        self.story.append(PageBreak())
+
+        # With a TOC: the first pass collects page numbers, the second renders them.
+        # maxPasses bounds the reflow instead of ReportLab's default of ten.
+        if any(isinstance(f, TableOfContents) for f in self.story):
+            doc.multiBuild(self.story, maxPasses=2)
+        else:
+            doc.build(self.story)
 
-                # Lesson type heading with improved design
-                lesson_type_heading = Paragraph(lesson_type, self.styles['LingoHeading2'])
-                lesson_type_heading._bookmarkName = f"{level_name}_{lesson_type}"
-                self.story.append(lesson_type_heading)
-
-                # Add to TOC
-                self.toc.addEntry(1, lesson_type, doc.page if hasattr(doc, 'page') else 0)
-
-                for filename in sorted(os.listdir(lesson_type_path)):
-                    if not filename.endswith('.json'):
-                        continue
-                    filepath = os.path.join(lesson_type_path, filename)
-                    print(f"Loading: {filepath}")
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        lesson = json.load(f)
-                    self.add_lesson(lesson)
-                    self.story.append(PageBreak())
-
-        doc.build(self.story)
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            shutil.copyfile(self.output_path, cached_path)
+        except OSError as e:
+            print(f"Could not cache textbook PDF: {e}")
+        else:
+            # Only the current build is worth keeping; every edit would otherwise leave a full PDF behind
+            for name in os.listdir(_CACHE_DIR):
+                path = os.path.join(_CACHE_DIR, name)
+                if name.startswith("textbook-") and name.endswith(".pdf") and path != cached_path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+        # Nothing needs the flowables after the build; release them right away
+        self.story = None
+        gc.collect()
 
     def add_lesson(self, lesson):
         # Lesson title with improved design
         title = lesson.get('title', 'Untitled Lesson')
         lesson_heading = Paragraph(title, self.styles['LingoLessonHeading'])
         lesson_heading._bookmarkName = title
-        self.story.append(lesson_heading)
+        buf = [lesson_heading]
 
         summary = lesson.get('summary', '')
         if summary:
-            self.story.append(Paragraph(summary, self.styles['LingoBodyText']))
-
-        t = lesson.get('type', '').lower()
-        if t == 'vocabulary':
-            for section in lesson.get('sections', []):
-                self.story.append(Paragraph(section.get('heading', ''), self.styles['LingoHeading2']))
-                content = section.get('content', '')
-                if content:
-                    self.story.append(Paragraph(content, self.styles['LingoBodyText']))
-                for example in section.get('examples', []):
-                    phrase = example.get('phrase', '')
-                    definition = example.get('definition', '')
-                    example_text = example.get('example', '')
-                    self.story.append(Paragraph(f"<b>{phrase}</b>: {definition}", 
-                                             self.styles['LingoVocabulary']))
-                    if example_text:
-                        self.story.append(Paragraph(f"<i>Example:</i> {example_text}", 
-                                                 self.styles['LingoExample']))
-                self.story.append(Spacer(1, 0.2*cm))
-
-        elif t == 'reading':
-            for passage in lesson.get('passages', []):
-                self.story.append(Paragraph(passage.get('title', ''), self.styles['LingoHeading2']))
-                self.story.append(Paragraph(passage.get('text', ''), self.styles['LingoBodyText']))
-                self.story.append(Spacer(1, 0.2*cm))
-            if 'questions' in lesson:
-                self.story.append(Paragraph("Comprehension Questions", self.styles['LingoHeading2']))
-                for q in lesson['questions']:
-                    self.story.append(Paragraph(f"<b>Q{q['id']}:</b> {q['question']}", 
-                                             self.styles['LingoBodyText']))
-                    if 'options' in q:
-                        options = "\n".join([f"{chr(65+i)}. {opt}" for i, opt in enumerate(q['options'])])
-                        self.story.append(Paragraph(options.replace("\n", "<br/>"), 
-                                         self.styles['LingoExample']))
-                    if 'hint' in q:
-                        self.story.append(Paragraph(f"<i>Hint:</i> {q['hint']}", 
-                                                 self.styles['LingoExample']))
-                    self.story.append(Spacer(1, 0.2*cm))
-
-        elif t == 'grammar':
-            for para in lesson.get('content', []):
-                self.story.append(Paragraph(para, self.styles['LingoBodyText']))
-            self.story.append(Spacer(1, 0.3*cm))
-            for ex in lesson.get('examples', []):
-                if isinstance(ex, dict):
-                    rule = ex.get('rule', '')
-                    self.story.append(Paragraph(f"<b>{rule}</b>", self.styles['LingoHeading2']))
-                    for example_line in ex.get('examples', []):
-                        self.story.append(Paragraph(example_line, self.styles['LingoExample']))
-                    self.story.append(Spacer(1, 0.2*cm))
-                else:
-                    self.story.append(Paragraph(ex, self.styles['LingoExample']))
-            tips = lesson.get('tips', [])
-            if tips:
-                self.story.append(Paragraph("Usage Tips", self.styles['LingoHeading2']))
-                for tip in tips:
-                    self.story.append(Paragraph(f"• {tip}", self.styles['LingoBodyText']))
-
-        self.story.append(Spacer(1, 0.2*cm))
+            buf.append(Paragraph(summary, self.styles['LingoBodyText']))
+        self.story.extend(buf)
+
+        render = self._RENDERERS.get(lesson.get('type', '').lower())
+        if render is not None:
+            render(self, lesson)
+
+        self.story.append(self._sp_small())
+
+    def _render_vocab(self, lesson):
+        buf = []
+        append = buf.append
+        P = Paragraph
+        styles = self.styles
+        heading_style = styles['LingoHeading2']
+        body_style = styles['LingoBodyText']
+        vocab_style = styles['LingoVocabulary']
+        example_style = styles['LingoExample']
+        sp_small = self._sp_small
+        for section in lesson.get('sections', []):
+            append(P(section.get('heading', ''), heading_style))
+            content = section.get('content', '')
+            if content:
+                append(P(content, body_style))
+            # Consecutive entries share one Paragraph, up to _VOCAB_GROUP lines;
+            # an example line ends the group so it still follows its own entry
+            lines = []
+            for example in section.get('examples', []):
+                phrase = example.get('phrase', '')
+                definition = example.get('definition', '')
+                example_text = example.get('example', '')
+                lines.append(f"<b>{esc(phrase)}</b>: {esc(definition)}")
+                if example_text or len(lines) >= self._VOCAB_GROUP:
+                    append(P("<br/>".join(lines), vocab_style))
+                    lines = []
+                if example_text:
+                    append(P(f"<i>Example:</i> {esc(example_text)}", example_style))
+            if lines:
+                append(P("<br/>".join(lines), vocab_style))
+            append(sp_small())
+        self.story.extend(buf)
+
+    def _render_reading(self, lesson):
+        buf = []
+        append = buf.append
+        P = Paragraph
+        styles = self.styles
+        heading_style = styles['LingoHeading2']
+        body_style = styles['LingoBodyText']
+        example_style = styles['LingoExample']
+        sp_small = self._sp_small
+        for passage in lesson.get('passages', []):
+            append(P(passage.get('title', ''), heading_style))
+            text = passage.get('text', '')
+            if isinstance(text, list):
+                text = "<br/><br/>".join(esc(t) for t in text)
+            else:
+                text = esc(text)
+            append(P(text, body_style))
+            append(sp_small())
+        if 'questions' in lesson:
+            append(P("Comprehension Questions", heading_style))
+            for q in lesson['questions']:
+                append(P(f"<b>Q{q['id']}:</b> {esc(q['question'])}", body_style))
+                if 'options' in q:
+                    options = "<br/>".join(f"{chr(65+i)}. {esc(opt)}" for i, opt in enumerate(q['options']))
+                    append(P(options, example_style))
+                if 'hint' in q:
+                    append(P(f"<i>Hint:</i> {esc(q['hint'])}", example_style))
+                append(sp_small())
+        self.story.extend(buf)
+
+    def _render_grammar(self, lesson):
+        buf = []
+        append = buf.append
+        P = Paragraph
+        styles = self.styles
+        heading_style = styles['LingoHeading2']
+        body_style = styles['LingoBodyText']
+        example_style = styles['LingoExample']
+        sp_small = self._sp_small
+        content = lesson.get('content', [])
+        if content:
+            append(P("<br/><br/>".join(esc(para) for para in content), body_style))
+        append(self._sp_med())
+        for ex in lesson.get('examples', []):
+            if isinstance(ex, dict):
+                rule = ex.get('rule', '')
+                append(P(f"<b>{rule}</b>", heading_style))
+                example_lines = ex.get('examples', [])
+                if example_lines:
+                    append(P("<br/>".join(example_lines), example_style))
+                append(sp_small())
+            else:
+                append(P(ex, example_style))
+        tips = lesson.get('tips', [])
+        if tips:
+            append(P("Usage Tips", heading_style))
+            append(P("<br/>".join(f"• {tip}" for tip in tips), body_style))
+        self.story.extend(buf)
+
+    _VOCAB_GROUP = 8  # vocabulary entries per Paragraph
+
+    # Lesson type -> renderer; looked up once per lesson instead of an if/elif chain
+    _RENDERERS = {
+        'vocabulary': _render_vocab,
+        'reading': _render_reading,
+        'grammar': _render_grammar,
+    }
 
 
 if __name__ == "__main__":
@@ -3,11 +3,16 @@ import os, sys, json, subprocess, threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 from styles import configure_styles
-import dashboard
-from student_manager import StudentManager
-from datetime import datetime
+try:
+    import orjson  # optional: faster JSON parsing
+except ImportError:
+    orjson = None
 
 class LoginScreen:
+    _styles_done = False  # ttk styles are global to the Tk interpreter; register them once
+    _icon_ok = True       # skip the icon load on later windows once it has failed
+    face_in_process = True  # False forces the recognize_live.py subprocess path
+
     def __init__(self, root, main_app):
         self.root = root
         self.main_app = main_app
@@ -19,10 +24,11 @@ class LoginScreen:
         configure_styles()
         self._configure_styles()
 
-        try:
-            self.root.iconbitmap('assets/logo.ico')
-        except:
-            pass
+        if LoginScreen._icon_ok:
+            try:
+                self.root.iconbitmap('assets/logo.ico')
+            except:
+                LoginScreen._icon_ok = False
 
         self._resolve_paths()
         self.create_widgets()
@@ -32,8 +38,15 @@ class LoginScreen:
         self.recognize_py = os.path.join(self.face_dir, "recognize_live.py")
         self.gui_face_rec_py = os.path.join(self.face_dir, "gui_face_rec.py")
         self.py_exec = sys.executable
+        # Checked once here instead of a stat before every login attempt; the scripts are
+        # run as `python script.py`, so a missing script would not raise FileNotFoundError
+        self._recognize_present = os.path.isfile(self.recognize_py)
+        self._gui_face_rec_present = os.path.isfile(self.gui_face_rec_py)
 
     def _configure_styles(self):
+        if LoginScreen._styles_done:
+            return
+        LoginScreen._styles_done = True
         style = ttk.Style()
         # Keep your existing styles
         style.configure("Green.TButton", foreground="white", background="#2ecc71",
@@ -51,9 +64,6 @@ class LoginScreen:
         # Container
         main = ttk.Frame(self.root, padding=16)
         main.pack(fill=tk.BOTH, expand=True)
-        self.root.update_idletasks()
-        self.root.minsize(self.root.winfo_width(), self.root.winfo_height())
-        self.root.resizable(True, True)
 
         # Branding
         header = ttk.Frame(main)
@@ -83,6 +93,11 @@ class LoginScreen:
         self.nb.bind("<<NotebookTabChanged>>", lambda e: self._maybe_auto_face())
         self.root.after(250, self._maybe_auto_face)
 
+        # One layout pass once everything is packed; the requested size is enough for minsize
+        self.root.update_idletasks()
+        self.root.minsize(self.root.winfo_reqwidth(), self.root.winfo_reqheight())
+        self.root.resizable(True, True)
+
 
     # ===================== TAB: LOG-IN =====================
     def _build_tab_login(self, parent):
@@ -114,30 +129,17 @@ class LoginScreen:
 
         
     def _start_face_login_once(self):
-        if not os.path.exists(self.recognize_py):
+        if not self._recognize_present:
             self.login_status.config(text="Face recognizer not found.")
             self._face_login_running = False
             return
 
-        # Run one-shot recognition with a visible window
+        # Run one-shot recognition; only the subprocess fallback shows a preview window
         def worker():
             try:
-                proc = subprocess.run(
-                    [self.py_exec, self.recognize_py, "--once", "--json", "--timeout", "12", "--show"],
-                    capture_output=True, text=True, cwd=self.face_dir
-                )
-                raw = (proc.stdout or "").strip()
-                # Be robust: find the last JSON-looking line
-                candidate = None
-                for line in reversed(raw.splitlines()):
-                    s = line.strip()
-                    if s.startswith("{") and s.endswith("}"):
-                        candidate = s
-                        break
-                if not candidate:
-                    # No JSON produced (camera busy / timeout / no face)
-                    raise ValueError("No JSON from recognizer")
-                data = json.loads(candidate)
+                data = self._recognize_in_process() if LoginScreen.face_in_process else None
+                if data is None:
+                    data = self._recognize_subprocess()
             except Exception as e:
                 err_msg = f"Face login error: {e}"
                 self.root.after(0, lambda m=err_msg: self._face_login_failed(m))
@@ -162,6 +164,32 @@ class LoginScreen:
 
         threading.Thread(target=worker, daemon=True).start()
 
+    def _recognize_in_process(self):
+        """Call the recognizer directly so retries skip interpreter start-up and cv2 imports"""
+        try:
+            from Face_Recognition import recognize_live
+            # No preview: cv2.imshow from this worker thread would fight Tk for the GUI
+            return recognize_live.run_once(timeout=12, show=False)
+        except (ImportError, SystemExit) as e:
+            # Missing deps/cascade/model: stop trying in-process and use the script from now on
+            print(f"In-process face recognizer unavailable, using subprocess: {e}")
+            LoginScreen.face_in_process = False
+            return None
+
+    def _recognize_subprocess(self):
+        """Fallback: run recognize_live.py in its own interpreter and parse its JSON line"""
+        proc = subprocess.run(
+            [self.py_exec, self.recognize_py, "--once", "--json", "--timeout", "12", "--show"],
+            capture_output=True, text=True, cwd=self.face_dir
+        )
+        # The result is the last line; earlier lines are the recognizer's own logging
+        raw = (proc.stdout or "").rstrip()
+        candidate = raw[raw.rfind("\n") + 1:].strip() or "{}"
+        if not (candidate.startswith("{") and candidate.endswith("}")):
+            # No JSON produced (camera busy / crash)
+            raise ValueError("No JSON from recognizer")
+        return orjson.loads(candidate) if orjson is not None else json.loads(candidate)
+
 
     # ===================== TAB: SIGN-UP =====================
     def _build_tab_signup(self, parent):
@@ -203,6 +231,7 @@ class LoginScreen:
             self.signup_status.config(text="Student already exists. Please log in.")
             return
 
+        from datetime import datetime
         new_student = {
             "name": name,
             "level": self.level_var.get(),
@@ -219,15 +248,18 @@ class LoginScreen:
         self.signup_status.config(text="Now add your face to enable quick login.")
 
     def launch_gui_face_rec(self):
-        if not os.path.exists(self.gui_face_rec_py):
+        if not self._gui_face_rec_present:
             messagebox.showerror("Face Tools", "gui_face_rec.py not found in Face_Recognition/")
             return
         try:
             subprocess.Popen([self.py_exec, self.gui_face_rec_py], cwd=self.face_dir)
+        except FileNotFoundError:
+            messagebox.showerror("Face Tools", "Python interpreter not found.")
         except Exception as e:
             messagebox.showerror("Face Tools", f"Failed to open: {e}")
 
     def open_dashboard(self):
+        import dashboard  # deferred so the login window paints before the dashboard's imports load
         dashboard_window = tk.Toplevel(self.main_app.root)
         dashboard.Dashboard(dashboard_window, self.main_app, self.student_manager)
         dashboard_window.geometry("1000x800")
@@ -3,9 +3,10 @@ import sys
 import time
 import json
 import math
-import wave
-import struct
 import shutil
+import functools
+import random
+import re
 import queue
 import threading
 import collections
@@ -16,6 +17,7 @@ from tkinter import ttk, scrolledtext
 from face_tracker import FaceTracker
 from dotenv import load_dotenv
 from openai import OpenAI
+import httpx
 
 # UI modules
 from styles import configure_styles
@@ -35,6 +37,7 @@ from key_manager import KeyManager
 
 # -------------------- NEW: audio & stt deps --------------------
 try:
+    import numpy as np  # already required by sounddevice and faster-whisper
     import sounddevice as sd
     import webrtcvad
     from faster_whisper import WhisperModel
@@ -98,38 +101,6 @@ def _find_piper_cmd(piper_bin_hint: str|None)->list[str]|None:
     except Exception:
         return None
         
-# inside class MainAIChat, replace the whole open_login() with this:
-
-def open_login(self):
-    # Pause face tracking & free camera
-    try:
-        if getattr(self, "_tracker", None):
-            self._tracker.pause_and_trackoff()
-    except Exception as _e:
-        print("[TRACK] pause for login error:", _e)
-
-    if self.login_window and self.login_window.winfo_exists():
-        self.login_window.lift()
-        return
-
-    self.login_window = tk.Toplevel(self.root)
-    self.login_window.protocol("WM_DELETE_WINDOW", self.on_login_close)
-    LoginScreen(self.login_window, self)
-    self.login_window.geometry("400x300")
-    self.login_window.transient(self.root)
-    self.login_window.grab_set()
-
-def on_login_close(self):
-    if self.login_window:
-        self.login_window.destroy()
-        self.login_window = None
-    try:
-        if getattr(self, "_tracker", None):
-            # resume after 1200 ms to avoid racing Picamera2 teardown
-            self.root.after(1200, self._tracker.resume_and_trackon)
-    except Exception as _e:
-        print("[TRACK] resume after login error:", _e)
-
 class PiperEngine:
     """
     Persistent RAW pipeline:
@@ -150,6 +121,8 @@ class PiperEngine:
         self._sd = None
         self._alive = False
         self._reader = None
+        self._writer = None
+        self._audio_q = None
         self._last_audio_ts = 0.0
 
     def start(self):
@@ -158,7 +131,7 @@ class PiperEngine:
         cmd = self._piper_cmd + ["--model", self.voice, "--output-raw", "--sentence_silence", "0.25"]
         self._p1 = subprocess.Popen(
             cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL, text=False, bufsize=0
+            stderr=subprocess.DEVNULL, text=False, bufsize=65536
         )
 
         # Start audio device
@@ -167,21 +140,55 @@ class PiperEngine:
         self._alive = True
         self._last_audio_ts = 0.0
 
-        # Pump piper stdout → sounddevice
-        def _pump():
+        # piper stdout → queue → sounddevice; a stalled device no longer stops the pipe
+        # being drained, and a slow pipe read no longer delays the next device write.
+        # Both threads quit once close()/start() swaps the queue out.
+        q = self._audio_q = queue.Queue(maxsize=32)
+
+        def _read():
+            # One 2048-sample block per read; an odd trailing byte is carried to the next read
+            buf = bytearray(4096); view = memoryview(buf); have = 0
             try:
-                while self._alive and self._p1 and self._p1.stdout:
-                    data = self._p1.stdout.read(4096)
-                    if not data:
+                while self._alive and self._audio_q is q and self._p1 and self._p1.stdout:
+                    # readinto1: at most one pipe read, so a short sentence tail isn't held back
+                    n = self._p1.stdout.readinto1(view[have:])
+                    if not n:
                         time.sleep(0.005)
                         continue
+                    have += n
+                    usable = have & ~1
+                    if not usable:
+                        continue
+                    chunk = bytes(buf[:usable])
+                    if have & 1:
+                        buf[0] = buf[usable]
+                    have &= 1
+                    while self._alive and self._audio_q is q:
+                        try:
+                            q.put(chunk, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+            except Exception:
+                pass
+
+        def _play():
+            try:
+                while self._alive and self._audio_q is q:
+                    try:
+                        chunk = q.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
                     # Write to audio device; this blocks until accepted by device buffer
-                    self._sd.write(memoryview(data).cast('h'))  # reinterpret bytes as int16
+                    self._sd.write(np.frombuffer(chunk, dtype=np.int16))
                     self._last_audio_ts = time.time()
             except Exception:
                 pass
-        self._reader = threading.Thread(target=_pump, daemon=True)
+
+        self._reader = threading.Thread(target=_read, daemon=True)
+        self._writer = threading.Thread(target=_play, daemon=True)
         self._reader.start()
+        self._writer.start()
 
     # ---- smarter chunk writer (no newline mid-sentence) ----
     def say_chunk(self, text: str, final: bool):
@@ -233,12 +240,12 @@ class PiperEngine:
             if self._p1: self._p1.terminate()
         except Exception:
             pass
-        self._p1 = None; self._sd = None; self._reader = None
+        self._p1 = None; self._sd = None; self._reader = None; self._writer = None; self._audio_q = None
 
 
 # -------------------- NEW: VAD recorder (16k, mono) --------------------
 class VADRecorder:
-    """WebRTC VAD + energy gate; writes 16k mono WAV and returns its path."""
+    """WebRTC VAD + energy gate; returns the take as 16k mono float32 for faster-whisper."""
     def __init__(self, sample_rate=16000, frame_ms=20, vad_aggr=3,
                  silence_ms=1200, max_record_s=10, device=None,
                  energy_margin=2.0, energy_min=2200, energy_max=6000, energy_calib_ms=500):
@@ -247,37 +254,35 @@ class VADRecorder:
         self.energy_margin=energy_margin; self.energy_min=energy_min; self.energy_max=energy_max; self.energy_calib_ms=energy_calib_ms
 
     @staticmethod
-    def _rms_int16(b: bytes)->float:
-        if not b: return 0.0
-        n=len(b)//2
-        if n<=0: return 0.0
-        s=struct.unpack(f"<{n}h", b); acc=0
-        for x in s: acc+=x*x
-        return math.sqrt(acc/float(n))
-
-    def record(self, out_wav: str) -> str:
+    def _rms_int16(samples)->float:
+        if samples.size==0: return 0.0
+        s=samples.astype(np.float64)  # int16 squares summed over a frame overflow int32
+        return math.sqrt(np.dot(s, s)/s.size)
+
+    def record(self) -> "np.ndarray":
         vad = webrtcvad.Vad(self.vad_aggr)
         frame_samp = int(self.sample_rate*(self.frame_ms/1000.0))
-        frame_bytes = frame_samp*2
         silence_frames_needed = max(1,int(self.silence_ms/self.frame_ms))
         max_frames = int(self.max_record_s*1000/self.frame_ms)
         calib_frames = max(1,int(self.energy_calib_ms/self.frame_ms))
-        ring=collections.deque(); voiced=False; trailing=0; total=0
+        ring=[]; voiced=False; trailing=0; total=0
         energy_thr=None; calib_vals=[]
         print(f"[VAD] start {self.sample_rate}Hz frame={self.frame_ms}ms agg={self.vad_aggr} stop>{self.silence_ms}ms")
         def _cb(indata, frames, time_info, status):
             nonlocal voiced, trailing, total, energy_thr
-            buf=indata.tobytes()
-            if len(buf)<frame_bytes: return
+            samples=indata.reshape(-1)  # int16 view, no copy
+            if samples.size<frame_samp: return
+            rms=self._rms_int16(samples)
+            # indata is reused after the callback returns; this is the frame's one copy
+            buf=samples.tobytes()
             ring.append(buf); total+=1
             if energy_thr is None and len(calib_vals)<calib_frames:
-                calib_vals.append(self._rms_int16(buf))
+                calib_vals.append(rms)
                 if len(calib_vals)==calib_frames:
                     base=sorted(calib_vals)[len(calib_vals)//2]
                     thr=max(self.energy_min,min(self.energy_max, base*self.energy_margin)); energy_thr=thr
                     print(f"\n[VAD] energy floor≈{int(base)} → thr≈{int(thr)}")
                 return
-            rms=self._rms_int16(buf)
             try:
                 speech = vad.is_speech(buf,self.sample_rate)
             except Exception:
@@ -298,26 +303,55 @@ class VADRecorder:
                     print("\n[VAD] max time reached"); break
                 if voiced and trailing>=silence_frames_needed:
                     print("\n[VAD] silence reached — stop"); break
-        os.makedirs(os.path.dirname(out_wav), exist_ok=True)
-        with wave.open(out_wav,'wb') as w:
-            w.setnchannels(1); w.setsampwidth(2); w.setframerate(self.sample_rate)
-            while ring: w.writeframes(ring.popleft())
         dur=total*self.frame_ms/1000.0
-        print(f"[VAD] wrote {out_wav} (≈{dur:.2f}s)")
-        return out_wav
+        print(f"[VAD] captured ≈{dur:.2f}s")
+        # transcribe() takes float32 in [-1, 1) directly, so no WAV encode/decode round-trip
+        return np.frombuffer(b"".join(ring), dtype=np.int16).astype(np.float32)/32768.0
 
 # -------------------- Existing constants (unchanged LLM) --------------------
 load_dotenv()
 
 SOFT_TIMEOUT_SECONDS = 6.0
 DEFAULT_MAX_TOKENS = 48
+# Circuit breaker: a provider is skipped for a while after it keeps failing
+BREAKER_FAILURES = 3
+COOLDOWN_AUTH_S = 600.0      # 401/403: almost certainly a bad key, retrying won't help
+COOLDOWN_RATE_S = 30.0       # 429: short back-off
+COOLDOWN_ERROR_S = 60.0      # 5xx, timeouts, anything else
+RETRY_DEADLINE_S = 25.0      # get_ai_response gives up retrying past this
+# Fail fast on a wedged connect; our own retry loop and breaker replace the SDK's retries
+LLM_TIMEOUT = httpx.Timeout(20.0, connect=5.0, write=5.0, pool=5.0)
+LLM_MAX_RETRIES = 0
 DEFAULT_STOP = ["\n\n", "Question:", "Q:", "Lingo:", "You:"]
 
 
 # STT models (paths unchanged)
 FW_BASE = "/home/robinglory/Desktop/Thesis/STT/faster-whisper/fw-base.en"
 FW_TINY = "/home/robinglory/Desktop/Thesis/STT/faster-whisper/fw-tiny.en"  # kept for completeness
-TEMP_WAV = "/tmp/fw_dialog.wav"
+
+# System prompts; the lesson one is filled from the lesson_context dict with str.format_map
+_LESSON_SYS = (
+    "You are Lingo teaching {student_name} (Level: {student_level}). "
+    "Current Lesson: {lesson_title}\n"
+    "Objective: {lesson_objective}\n"
+    "Rules (MANDATORY):\n"
+    "• BASE ANSWERS ONLY on lesson content the user is studying now. If not present, say: "
+    "\"The lesson text doesn’t say yet.\" and ask a tiny guiding question.\n"
+    "• 1–2 sentences MAX (≤40 words total) + end with ONE short question.\n"
+    "• NO emojis. NO asterisks '*'.\n"
+    "• Do NOT start with phrases like 'In this lesson,' 'We will learn,' or repeat prior lines.\n"
+    "• Avoid repeating yourself or re-stating the same example.\n"
+)
+_GENERAL_SYS = (
+    "You are Lingo, a friendly AI English Teacher.\n"
+    "Rules: 1–2 sentences (≤40 words) + end with ONE short question. "
+    "No emojis. Avoid the '*' character. Do not repeat yourself."
+)
+
+# Long sessions: the Text widget slows down as it grows, and the LLM only ever sees the last 4 messages
+MAX_CHAT_LINES = 2000
+KEEP_CHAT_LINES = 1500
+MAX_HISTORY = 40
 
 # -------------------- Your existing LLM handler (with watchdog hedge) --------------------
 class LLMHandler:
@@ -330,6 +364,14 @@ class LLMHandler:
     """
     def __init__(self, key_manager: KeyManager):
         self.key_manager = key_manager
+        # One keep-alive pool to openrouter.ai shared by every provider's client
+        self._http = httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=60),
+            timeout=LLM_TIMEOUT,
+        )
+        print(f"[LLM] max_tokens={DEFAULT_MAX_TOKENS}, timeout={LLM_TIMEOUT}, max_retries={LLM_MAX_RETRIES}")
+        self._clients = {}  # provider idx -> OpenAI client, built once
+        self._callers = {}  # provider idx -> create() with the per-provider arguments pre-bound
         self._reload_providers_from_profile()
         self.current_provider = 0
         self.client = self._create_client()
@@ -369,38 +411,112 @@ class LLMHandler:
     
     def _reload_providers_from_profile(self):
         keys = self.key_manager.get_keys()
+        # Each entry also carries circuit-breaker state (fail_count, cooldown_until; see _record_failure)
+        # and routing data: weight for the random first pick, priority for the fallback order, and
+        # latency_ema (seconds, 0 until measured) which biases the pick toward faster providers
         self.api_providers = [
             {
                 "name": "Arcee AI",
                 "api_key": keys["ARCEE_API_KEY"],
                 "model": "arcee-ai/trinity-large-preview:free",
                 "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Teacher"},
+                "weight": 0.5, "priority": 3, "latency_ema": 0.0,
+                "fail_count": 0, "cooldown_until": 0.0,
             },
             {
                 "name": "Liquid AI",
                 "api_key": keys["LIQUID_API_KEY"],
                 "model": "liquid/lfm-2.5-1.2b-thinking:free",
                 "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Teacher"},
+                "weight": 0.3, "priority": 2, "latency_ema": 0.0,
+                "fail_count": 0, "cooldown_until": 0.0,
             },
             {
                 "name": "Molmo AI",
                 "api_key": keys["MOLMO_API_KEY"],
                 "model": "allenai/molmo-2-8b:free",
                 "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Teacher"},
+                "weight": 0.2, "priority": 1, "latency_ema": 0.0,
+                "fail_count": 0, "cooldown_until": 0.0,
             }
         ]
-
+        # Keep the clients (and their warm connections); the SDK reads api_key per request
+        for idx, client in self._clients.items():
+            client.api_key = self.api_providers[idx]["api_key"]
 
 
     def _create_client(self, provider_idx=None):
         idx = self.current_provider if provider_idx is None else provider_idx
-        p = self.api_providers[idx]
-        client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=p["api_key"], timeout=20.0)
-        client._client.headers.update(p["headers"])
+        client = self._clients.get(idx)
+        if client is None:
+            p = self.api_providers[idx]
+            client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=p["api_key"], timeout=LLM_TIMEOUT,
+                            max_retries=LLM_MAX_RETRIES, http_client=self._http, default_headers=p["headers"])
+            self._clients[idx] = client
         return client
 
+    def prewarm(self):
+        """Open a pooled connection to openrouter.ai ahead of the first message; failure is harmless"""
+        try:
+            self._http.head("https://openrouter.ai/api/v1/models", timeout=5.0)
+        except Exception as e:
+            print("[LLM] prewarm skipped:", e)
+
+    def _caller(self, idx):
+        """chat.completions.create for a provider with model, temperature and stop already bound"""
+        caller = self._callers.get(idx)
+        if caller is None:
+            p = self.api_providers[idx]
+            caller = functools.partial(self._create_client(idx).chat.completions.create,
+                                       model=p["model"], temperature=0.4, stop=DEFAULT_STOP)
+            self._callers[idx] = caller
+        return caller
+
+    def _is_cooling(self, idx) -> bool:
+        return self.api_providers[idx]["cooldown_until"] > time.monotonic()
+
+    def _weighted_order(self):
+        """Provider indices to try: a weighted random first pick, then the rest by priority"""
+        n = len(self.api_providers)
+        ready = [i for i in range(n) if not self._is_cooling(i)] or list(range(n))
+        # Spread calls over the free-tier keys, leaning away from providers that have been slow
+        scores = [self.api_providers[i]["weight"] / (self.api_providers[i]["latency_ema"] or 1.0)
+                  for i in ready]
+        first = random.choices(ready, weights=scores, k=1)[0]
+        rest = sorted((i for i in range(n) if i != first),
+                      key=lambda i: (self._is_cooling(i), -self.api_providers[i]["priority"]))
+        return [first] + rest
+
+    def _record_latency(self, idx, dt):
+        p = self.api_providers[idx]
+        p["latency_ema"] = dt if not p["latency_ema"] else 0.8 * p["latency_ema"] + 0.2 * dt
+
+    def _record_failure(self, idx, emsg: str):
+        p = self.api_providers[idx]
+        m = emsg.lower()
+        if any(w in m for w in ["401", "403", "unauthorized", "forbidden", "invalid api key"]):
+            p["fail_count"] = 0
+            p["cooldown_until"] = time.monotonic() + COOLDOWN_AUTH_S
+            return
+        p["fail_count"] += 1
+        if p["fail_count"] >= BREAKER_FAILURES:
+            rate = any(w in m for w in ["429", "too many requests", "rate"])
+            p["fail_count"] = 0
+            p["cooldown_until"] = time.monotonic() + (COOLDOWN_RATE_S if rate else COOLDOWN_ERROR_S)
+
+    def _record_success(self, idx):
+        self.api_providers[idx]["fail_count"] = 0
+
     def _switch_provider(self):
-        self.current_provider = (self.current_provider + 1) % len(self.api_providers)
+        # Next provider that isn't cooling down (or simply the next one if they all are)
+        n = len(self.api_providers)
+        for k in range(1, n + 1):
+            idx = (self.current_provider + k) % n
+            if not self._is_cooling(idx):
+                break
+        else:
+            idx = (self.current_provider + 1) % n
+        self.current_provider = idx
         print(f"Switching model to {self.api_providers[self.current_provider]['name']}...")
         self.client = self._create_client()
 
@@ -436,29 +552,14 @@ class LLMHandler:
                 raise ValueError("Either message or messages must be provided")
 
             if lesson_context:
-                system_msg = (
-                    f"You are Lingo teaching {lesson_context['student_name']} (Level: {lesson_context['student_level']}). "
-                    f"Current Lesson: {lesson_context['lesson_title']}\n"
-                    f"Objective: {lesson_context['lesson_objective']}\n"
-                    "Rules (MANDATORY):\n"
-                    "• BASE ANSWERS ONLY on lesson content the user is studying now. If not present, say: "
-                    "\"The lesson text doesn’t say yet.\" and ask a tiny guiding question.\n"
-                    "• 1–2 sentences MAX (≤40 words total) + end with ONE short question.\n"
-                    "• NO emojis. NO asterisks '*'.\n"
-                    "• Do NOT start with phrases like 'In this lesson,' 'We will learn,' or repeat prior lines.\n"
-                    "• Avoid repeating yourself or re-stating the same example.\n"
-                )
+                system_msg = _LESSON_SYS.format_map(lesson_context)
             else:
-                system_msg = (
-                    "You are Lingo, a friendly AI English Teacher.\n"
-                    "Rules: 1–2 sentences (≤40 words) + end with ONE short question. "
-                    "No emojis. Avoid the '*' character. Do not repeat yourself."
-                )
+                system_msg = _GENERAL_SYS
 
 
             messages = [{"role": "system", "content": system_msg}]
             if conversation_history:
-                messages.extend(conversation_history[-4:])
+                messages.extend(list(conversation_history)[-4:])
                 messages = [
                 m for m in messages
                 if not (m.get("role") == "assistant"
@@ -468,26 +569,43 @@ class LLMHandler:
 
             messages.append({"role": "user", "content": message})
 
-        p = self.api_providers[self.current_provider]
-        try:
-            # NEW: compute per-request max_tokens
-            max_tokens = self._max_tokens_for(messages)
-
-            resp = self.client.chat.completions.create(
-                model=p["model"],
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=0.4,
-                stop=DEFAULT_STOP
-            )
-            return resp.choices[0].message.content.strip()
-        except Exception as e:
-            emsg = str(e)
-            if self._is_quota_or_auth_error(emsg):
-                return self._quota_message()
-            print(f"Error with {p['name']}: {emsg}")
-            self._switch_provider()
-            return "I'm having trouble connecting right now. Please try again."
+        # Providers whose breaker is open go last, so they cost no timeout while others are healthy
+        order = self._weighted_order()
+
+        # NEW: compute per-request max_tokens
+        max_tokens = self._max_tokens_for(messages)
+        # One attempt per provider, backing off between them, never past RETRY_DEADLINE_S in total
+        deadline = time.monotonic() + RETRY_DEADLINE_S
+        for attempt, idx in enumerate(order):
+            self.current_provider = idx
+            self.client = self._create_client()
+            p = self.api_providers[idx]
+            t0 = time.monotonic()
+            try:
+                resp = self._caller(idx)(messages=messages, max_tokens=max_tokens)
+                reply = resp.choices[0].message.content.strip()
+                self._record_success(idx)
+                self._record_latency(idx, time.monotonic() - t0)
+                return reply
+            except Exception as e:
+                emsg = str(e)
+                self._record_failure(idx, emsg)
+                print(f"Error with {p['name']}: {emsg}")
+                if not self._is_retryable(emsg) or attempt == len(order) - 1:
+                    break
+                delay = min(0.25 * (2 ** attempt) + random.uniform(0, 0.25), 4.0)
+                if time.monotonic() + delay > deadline:
+                    break
+                time.sleep(delay)
+        if self._is_quota_or_auth_error(emsg):
+            return self._quota_message()
+        return "I'm having trouble connecting right now. Please try again."
+
+    _NON_RETRYABLE_RE = re.compile(r"\b(400|401|403)\b|unauthorized|forbidden|invalid api key")
+
+    def _is_retryable(self, emsg: str) -> bool:
+        """429s, 5xx, timeouts and connection errors are worth another provider; bad requests and keys aren't"""
+        return self._NON_RETRYABLE_RE.search(emsg.lower()) is None
 
 
     # ---------- Streaming + Hedge + first-token fallback ----------
@@ -508,29 +626,14 @@ class LLMHandler:
                 raise ValueError("Either `messages` or (`message` and optional context) must be provided")
 
             if lesson_context:
-                system_msg = (
-                    f"You are Lingo teaching {lesson_context['student_name']} (Level: {lesson_context['student_level']}). "
-                    f"Current Lesson: {lesson_context['lesson_title']}\n"
-                    f"Objective: {lesson_context['lesson_objective']}\n"
-                    "Rules (MANDATORY):\n"
-                    "• BASE ANSWERS ONLY on lesson content the user is studying now. If not present, say: "
-                    "\"The lesson text doesn’t say yet.\" and ask a tiny guiding question.\n"
-                    "• 1–2 sentences MAX (≤40 words total) + end with ONE short question.\n"
-                    "• NO emojis. NO asterisks '*'.\n"
-                    "• Do NOT start with phrases like 'In this lesson,' 'We will learn,' or repeat prior lines.\n"
-                    "• Avoid repeating yourself or re-stating the same example.\n"
-                )
+                system_msg = _LESSON_SYS.format_map(lesson_context)
             else:
-                system_msg = (
-                    "You are Lingo, a friendly AI English Teacher.\n"
-                    "Rules: 1–2 sentences (≤40 words) + end with ONE short question. "
-                    "No emojis. Avoid the '*' character. Do not repeat yourself."
-                )
+                system_msg = _GENERAL_SYS
 
             messages = [{"role": "system", "content": system_msg}]
             if conversation_history:
                 # keep ONLY last 2 exchanges
-                messages.extend(conversation_history[-4:])
+                messages.extend(list(conversation_history)[-4:])
                 messages = [
                     m for m in messages
                     if not (m.get("role") == "assistant"
@@ -542,9 +645,8 @@ class LLMHandler:
         # NEW: compute per-request max_tokens once for all streams
         _req_max_tokens = self._max_tokens_for(messages)
 
-        idx_a = self.current_provider
-        idx_b = (self.current_provider + 1) % len(self.api_providers)
-        idx_c = (self.current_provider + 2) % len(self.api_providers)
+        # Weighted pick leads, the rest follow by priority; open breakers are only the last resort
+        idx_a, idx_b, idx_c = self._weighted_order()[:3]
 
         out_q: queue.Queue = queue.Queue()
         import re
@@ -568,16 +670,13 @@ class LLMHandler:
         def stream_from_provider(provider_idx: int):
             p = self.api_providers[provider_idx]
             def _open_stream():
-                client = self._create_client(provider_idx)
-                return client.chat.completions.create(
-                    model=p["model"],
+                return self._caller(provider_idx)(
                     messages=messages,
                     max_tokens=_req_max_tokens,   # ← use the computed value
-                    temperature=0.4,
-                    stop=DEFAULT_STOP,
                     stream=True
                 )
 
+            t_open = _time.time()
             try:
                 stream = _open_stream()
                 for event in stream:
@@ -593,6 +692,8 @@ class LLMHandler:
                         if winner_idx["value"] is None:
                             winner_idx["value"] = provider_idx
                             first_token_time["value"] = now
+                            self._record_success(provider_idx)
+                            self._record_latency(provider_idx, now - t_open)
                             for k in stop_flags.keys():
                                 if k != provider_idx:
                                     stop_flags[k].set()
@@ -602,6 +703,7 @@ class LLMHandler:
             except Exception as e:
                 emsg = str(e)
                 with winner_lock:
+                    self._record_failure(provider_idx, emsg)
                     if winner_idx["value"] is None:
                         if self._is_quota_or_auth_error(emsg):
                             out_q.put("\n" + self._quota_message())
@@ -658,6 +760,19 @@ class LLMHandler:
                 accumulated += new_text
                 yield new_text
 
+_FMT_CACHE = {}  # (epoch second, format) -> formatted string; only the current second is kept
+
+def _fmt_now(fmt: str) -> str:
+    """datetime.now().strftime(fmt), reused for repeat queries within the same second"""
+    sec = int(time.time())
+    key = (sec, fmt)
+    v = _FMT_CACHE.get(key)
+    if v is None:
+        if any(k[0] != sec for k in _FMT_CACHE):
+            _FMT_CACHE.clear()
+        v = _FMT_CACHE[key] = datetime.now().strftime(fmt)
+    return v
+
 # -------------------- GUI (kept style; TTS-first policy) --------------------
 class MainAIChat:
     def __init__(self, root):
@@ -677,12 +792,15 @@ class MainAIChat:
         # Key manager + LLM
         self.key_manager = KeyManager()
         self.llm = LLMHandler(self.key_manager)
+        # DNS + TCP + TLS to openrouter.ai overlaps with the user typing their first message
+        threading.Thread(target=self.llm.prewarm, daemon=True).start()
 
         self.lesson_manager = LessonManager(llm_handler=self.llm)
         self.student_manager = StudentManager(lesson_manager=self.lesson_manager)
 
         self.current_lesson = None
-        self.conversation_history = []
+        # Only the last four messages reach the model; deque keeps long sessions bounded
+        self.conversation_history = collections.deque(maxlen=MAX_HISTORY)
         self.login_window = None
         self.dashboard_window = None
 
@@ -840,6 +958,10 @@ class MainAIChat:
             insertbackground="#6c5ce7"
         )
         self.chat_display.pack(fill=tk.BOTH, expand=True)
+        # Tag styles are widget-global; configure them once here
+        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
+        self.chat_display.tag_config("user", foreground="#00b894", font=("Segoe UI", 12, "bold"))
+        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
 
         input_frame = ttk.Frame(main_frame, style="Input.TFrame")
         input_frame.pack(fill=tk.X)
@@ -892,20 +1014,26 @@ class MainAIChat:
 
     def display_message(self, sender, message):
         self.chat_display.configure(state='normal')
-        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("user", foreground="#00b894", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
         self.chat_display.insert(tk.END, f"{sender}: ", "ai" if sender == "Lingo" else "user")
         self.chat_display.insert(tk.END, f"{message}\n\n", "message")
+        self._trim_chat()
         self.chat_display.see(tk.END)
         self.chat_display.configure(state='disabled')
 
     def _append_stream_text(self, text: str):
         self.chat_display.configure(state='normal')
         self.chat_display.insert(tk.END, text, "message")
+        self._trim_chat()
         self.chat_display.see(tk.END)
         self.chat_display.configure(state='disabled')
 
+    def _trim_chat(self):
+        """Drop the oldest lines once the transcript passes MAX_CHAT_LINES (widget must be 'normal')"""
+        end_line = int(self.chat_display.index('end-1c').split('.')[0])
+        if end_line > MAX_CHAT_LINES:
+            self.chat_display.delete('1.0', f'{end_line - KEEP_CHAT_LINES}.0')
+            self.chat_display.mark_set(tk.INSERT, tk.END)
+
     # ---- TTS drain (also commits GUI after speech ends) ----
     def _drain_tts_queue(self):
         try:
@@ -997,16 +1125,15 @@ class MainAIChat:
             }
 
         self._begin_turn_gui_header()
-        # --- Arduino: THINK for typed path too ---
-        self._serial_send("think")
-        self._speech_state = "THINKING"
-        # NEW: pause tracking while THINK/TALK runs
-        try: self._tracker.pause_and_trackoff()
-        except Exception as _e: print("[TRACK] pause error:", _e)
-
-
 
+        # Serial I/O (which may open the port) and the LLM call both stay off the Tk thread
         def worker():
+            # --- Arduino: THINK for typed path too ---
+            self._serial_send("think")
+            self._speech_state = "THINKING"
+            # NEW: pause tracking while THINK/TALK runs
+            try: self._tracker.pause_and_trackoff()
+            except Exception as _e: print("[TRACK] pause error:", _e)
             try:
                 # Accumulate full text for GUI while feeding TTS immediately
                 full_parts = []
@@ -1054,13 +1181,15 @@ class MainAIChat:
         self._streaming = True
         self.root.config(cursor="watch")
         self.chat_display.configure(state='normal')
-        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
         self.chat_display.insert(tk.END, "Lingo: ", "ai")
         self.chat_display.configure(state='disabled')
         self.chat_display.see(tk.END)
         self._start_thinking()
 
+    def _ui(self, fn, *args):
+        """Run fn on the Tk thread; worker threads must not touch widgets directly"""
+        self.root.after(0, fn, *args)
+
     # ---- voice path (TTS-first, GUI-after) ----
     def on_speak(self):
         if self._streaming:
@@ -1069,7 +1198,7 @@ class MainAIChat:
             try:
                 self._ensure_stt()
                 # RECORD
-                self.set_status("Recording…"); print("[GUI] Recording…")
+                self._ui(self.set_status, "Recording…"); print("[GUI] Recording…")
                 
                 # NEW: pause tracking and send track_off so gestures have full control
                 try: self._tracker.pause_and_trackoff()
@@ -1083,30 +1212,30 @@ class MainAIChat:
                                   silence_ms=1200, max_record_s=10,
                                   energy_margin=2.0, energy_min=2200, energy_max=6000)
                 self._speech_state = "LISTENING"
-                wav_path = rec.record(TEMP_WAV)
+                audio = rec.record()
 
                 # TRANSCRIBE
-                self.set_status("Transcribing…"); print("[GUI] Transcribing…")
+                self._ui(self.set_status, "Transcribing…"); print("[GUI] Transcribing…")
                 # --- Arduino: THINK during STT/LLM ---
                 self._serial_send("think")
                 self._set_state("THINKING")
 
                 t0 = time.perf_counter()
                 segments, info = self._stt_model.transcribe(
-                    wav_path, language="en", beam_size=3, vad_filter=True,
+                    audio, language="en", beam_size=3, vad_filter=True,
                     vad_parameters=dict(min_silence_duration_ms=400)
                 )
                 user_text = "".join(s.text for s in segments).strip()
                 print(f"[STT] (len≈{info.duration:.2f}s, asr={time.perf_counter()-t0:.2f}s)")
-                self.set_status("Ready")
+                self._ui(self.set_status, "Ready")
                 if not user_text:
-                    self.display_message("STT", "(No speech detected)")
+                    self._ui(self.display_message, "STT", "(No speech detected)")
                     self._serial_send("stop")
                     self._set_state("IDLE")
                     return
 
                 # push transcript to chat & history
-                self.display_message("You", user_text)
+                self._ui(self.display_message, "You", user_text)
                 self.conversation_history.append({"role": "user", "content": user_text})
 
                 # lesson context
@@ -1119,8 +1248,9 @@ class MainAIChat:
                         "lesson_objective": self.current_lesson.get("objective", "")
                     }
 
-                # start turn (GUI header only)
-                self._begin_turn_gui_header()
+                # start turn (GUI header only); flags it now so a second click can't start a turn
+                self._streaming = True
+                self._ui(self._begin_turn_gui_header)
 
                 # TTS-first streaming
                 full_parts = []
@@ -1162,23 +1292,32 @@ class MainAIChat:
 
         threading.Thread(target=_worker, daemon=True).start()
 
+    # One pass over the message; word boundaries keep "hi" from matching inside "this"
+    _SIMPLE_RE = re.compile(r"\b(hello|hi|hey|how are you|how's it going|bye|goodbye|see you|time|date)\b")
+    _GREETINGS = (
+        "Hello there! How can I help you today?",
+        "Hi! What would you like to know?",
+        "Greetings! What's on your mind?",
+    )
+    _SIMPLE_REPLIES = {
+        "greeting": lambda: random.choice(MainAIChat._GREETINGS),
+        "how": lambda: "I'm doing well and ready to help! How are you?",
+        "bye": lambda: "Goodbye! Feel free to come back if you have more questions.",
+        "time": lambda: f"The current time is {_fmt_now('%H:%M')}.",
+        "date": lambda: f"Today's date is {_fmt_now('%Y-%m-%d')}.",
+    }
+    _SIMPLE_KINDS = {
+        "hello": "greeting", "hi": "greeting", "hey": "greeting",
+        "how are you": "how", "how's it going": "how",
+        "bye": "bye", "goodbye": "bye", "see you": "bye",
+        "time": "time", "date": "date",
+    }
+
     def get_simple_response(self, message):
-        import random
-        if any(word in message for word in ["hello", "hi", "hey"]):
-            return random.choice([
-                "Hello there! How can I help you today?",
-                "Hi! What would you like to know?",
-                "Greetings! What's on your mind?"
-            ])
-        elif any(word in message for word in ["how are you", "how's it going"]):
-            return "I'm doing well and ready to help! How are you?"
-        elif any(word in message for word in ["bye", "goodbye", "see you"]):
-            return "Goodbye! Feel free to come back if you have more questions."
-        elif "time" in message:
-            return f"The current time is {datetime.now().strftime('%H:%M')}."
-        elif "date" in message:
-            return f"Today's date is {datetime.now().strftime('%Y-%m-%d')}."
-        return None
+        m = self._SIMPLE_RE.search(message)
+        if not m:
+            return None
+        return self._SIMPLE_REPLIES[self._SIMPLE_KINDS[m.group(1)]]()
 
     def open_login(self):
         # Pause face tracking to free the camera and send 'track_off' to UNO
@@ -1,28 +1,102 @@
 # main.py
 import os
+import time
+import asyncio
 import threading
 import queue
+import collections
+import random
+import re
+import functools
+import hashlib
+import json
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 
 from dotenv import load_dotenv
-from openai import OpenAI
+try:
+    import h2  # noqa: F401  optional: lets httpx multiplex the providers over HTTP/2
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 # UI modules
+# login, student_manager and lesson_manager (TinyDB) are imported on first use, after the first paint
 from styles import configure_styles
-from login import LoginScreen
-from student_manager import StudentManager
-from lesson_manager import LessonManager
 
 # Multi-account manager (keys.json + settings.json)
 from key_manager import KeyManager
+from semantic_cache import SemanticCache
 
 load_dotenv()
 
-SOFT_TIMEOUT_SECONDS = 6.0
-DEFAULT_MAX_TOKENS = 96
-DEFAULT_STOP = ["\n\n", "Question:", "Q:"]
+SOFT_TIMEOUT_SECONDS = 6.0  # upper bound; the referee adapts below it from recent first-token times
+DEFAULT_MAX_TOKENS = 72   # general chat: the prompt asks for <=60 words
+LESSON_MAX_TOKENS = 96    # lesson turns keep the longer budget
+SHORT_MAX_TOKENS = 32     # greeting-like messages under SHORT_MESSAGE_WORDS words
+SHORT_MESSAGE_WORDS = 6
+DEFAULT_STOP = ("\n\n", "Question:", "Q:")
+TEMPERATURE = 0.7
+# Every provider goes through OpenRouter with the same attribution headers (read-only)
+_OPENROUTER_HEADERS = {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Assistant"}
+# Producer-side batching: flush after this many deltas or this many seconds
+STREAM_BATCH_CHUNKS = 8
+STREAM_FLUSH_SECONDS = 0.025
+# The backup provider only starts once the leader is this much slower than its usual first token
+HEDGE_DELAY_FACTOR = 1.5
+# ...and never sooner than this, so a fast leader's normal jitter doesn't open a second stream
+HEDGE_DELAY_SECONDS = 0.4
+# Every Nth message races the leader against a challenger from the start
+PROBE_EVERY = 5
+# Log first-event / first-content timings for each race winner
+_DEBUG = bool(os.environ.get("LINGO_DEBUG"))
+# Exact-match reply cache; only early turns are cached so a reply never depends on a long history
+_RESP_CACHE_MAX = 256
+_RESP_CACHE_MAX_HISTORY = 2
+# Paraphrase cache in the chat window; keyed on the message alone, so held to the same early turns
+SEMANTIC_CACHE_MAX_HISTORY = _RESP_CACHE_MAX_HISTORY
+
+
+# System prompt templates; filled with str.format_map so they can be swapped without code changes
+_LESSON_TMPL = (
+    "You are Lingo teaching {student_name} (Level: {student_level}). "
+    "Current Lesson: {lesson_title}\n"
+    "Objective: {lesson_objective}\n"
+    "Guidelines:\n"
+    "1. Reference the lesson content\n"
+    "2. Personalize explanations\n"
+    "3. Keep responses focused and don't use any emoji and avoid '*' character.\n"
+    "4. Keep responses short (<=2 sentences, <=60 words) and end with one short question.\n"
+)
+_GENERIC_TMPL = (
+    "You are Lingo, a friendly AI English Teacher. "
+    "Have natural conversations and help with general English questions. "
+    "Keep responses <=2 sentences (<=60 words) and end with one short question. "
+    "Avoid the '*' character."
+)
+_LESSON_FIELDS = ("student_name", "student_level", "lesson_title", "lesson_objective")
+
+
+@functools.lru_cache(maxsize=8)
+def _system_message(lesson_key=None):
+    """System message for a lesson key (values of _LESSON_FIELDS), or general chat when None"""
+    if lesson_key:
+        content = _LESSON_TMPL.format_map(dict(zip(_LESSON_FIELDS, lesson_key)))
+    else:
+        content = _GENERIC_TMPL
+    # Shared between calls; callers must not mutate it
+    return {"role": "system", "content": content}
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_messages(lesson_key, recent, message):
+    """Request messages for a lesson key, the recent (role, content) pairs and the new message"""
+    # Shared like the system message: a retry or the hedge reuses the same list
+    messages = [_system_message(lesson_key)]
+    messages.extend({"role": role, "content": content} for role, content in recent)
+    messages.append({"role": "user", "content": message})
+    return messages
 
 
 class LLMHandler:
@@ -35,9 +109,24 @@ class LLMHandler:
     """
     def __init__(self, key_manager: KeyManager):
         self.key_manager = key_manager
+        # One pooled httpx client per kind (sync/async), shared by every provider since
+        # they all talk to openrouter.ai; built on first use
+        self._http = None
+        self._ahttp = None
+        self._clients = {}
+        self._async_clients = {}
         self._reload_providers_from_profile()
         self.current_provider = 0
         self.client = self._create_client()
+        self._ttfb_ewma = {}  # provider idx -> smoothed seconds to first token
+        self._probe_counter = 0
+        self._ttfb_samples = collections.deque(maxlen=32)  # winners' first-token seconds, any provider
+        self._resp_cache = collections.OrderedDict()  # request key -> full reply text (LRU)
+        self.last_stream_complete = False  # the last streamed reply ended normally
+        self.last_stream_reply = None  # its text, winner only, when it did
+        # Background event loop that runs every streaming race (started on first use)
+        self._loop = None
+        self._loop_lock = threading.Lock()
 
     # ----- Profile & provider plumbing -----
     def _reload_providers_from_profile(self):
@@ -47,29 +136,84 @@ class LLMHandler:
                 "name": "Qwen3 Coder",
                 "api_key": keys["QWEN_API_KEY"],
                 "model": "qwen/qwen3-coder:free",
-                "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Assistant"},
+                "headers": _OPENROUTER_HEADERS,
+                # Sampling settings sent with every request to this model; tune per provider here
+                "gen_params": {"temperature": TEMPERATURE, "stop": DEFAULT_STOP},
             },
             {
                 "name": "Mistral 7B",
                 "api_key": keys["MISTRAL_API_KEY"],
                 "model": "mistralai/mistral-7b-instruct:free",
-                "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Assistant"},
+                "headers": _OPENROUTER_HEADERS,
+                "gen_params": {"temperature": TEMPERATURE, "stop": DEFAULT_STOP},
             },
             {
                 "name": "GPT-OSS-20B",
                 "api_key": keys["GPT_OSS_API_KEY"],
                 "model": "openai/gpt-oss-20b:free",
-                "headers": {"HTTP-Referer": "http://localhost:3000", "X-Title": "Lingo AI Assistant"},
+                "headers": _OPENROUTER_HEADERS,
+                "gen_params": {"temperature": TEMPERATURE, "stop": DEFAULT_STOP},
             }
         ]
+        # Cached clients survive a profile change; the SDK builds the Authorization
+        # header from api_key on every request, so swapping the key is enough
+        for cache in (self._clients, self._async_clients):
+            for idx, client in cache.items():
+                client.api_key = self.api_providers[idx]["api_key"]
 
     def _create_client(self, provider_idx=None):
+        """Return the cached client for a provider so its connection pool is reused"""
         idx = self.current_provider if provider_idx is None else provider_idx
+        client = self._clients.get(idx)
+        if client is None:
+            client = self._clients[idx] = self._build_client(idx)
+        return client
+
+    def _build_client(self, idx):
+        from openai import OpenAI  # imported on first use, off the UI start-up path
+        if self._http is None:
+            import httpx
+            self._http = httpx.Client(http2=_HTTP2, timeout=20.0,
+                                      limits=httpx.Limits(max_connections=8, max_keepalive_connections=8))
         p = self.api_providers[idx]
-        client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=p["api_key"], timeout=20.0)
-        client._client.headers.update(p["headers"])
+        # Headers go on the OpenAI wrapper, not the shared httpx client
+        return OpenAI(base_url="https://openrouter.ai/api/v1", api_key=p["api_key"], timeout=20.0,
+                      http_client=self._http, default_headers=p["headers"])
+
+    def _create_async_client(self, idx):
+        """Async twin of _create_client; only used on the background loop, so it stays bound to it"""
+        client = self._async_clients.get(idx)
+        if client is None:
+            from openai import AsyncOpenAI
+            if self._ahttp is None:
+                import httpx
+                self._ahttp = httpx.AsyncClient(http2=_HTTP2, timeout=20.0,
+                                                limits=httpx.Limits(max_connections=8, max_keepalive_connections=8))
+            p = self.api_providers[idx]
+            client = AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=p["api_key"], timeout=20.0,
+                                 http_client=self._ahttp, default_headers=p["headers"])
+            self._async_clients[idx] = client
         return client
 
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def warm_up(self, timeout=10.0):
+        """Open the pooled connections before the first message so it skips DNS and TLS set-up"""
+        async def touch_all():
+            # One cheap GET per provider, concurrently, so a hedged pair finds two open sockets
+            await asyncio.gather(*(self._create_async_client(i).models.list()
+                                   for i in range(len(self.api_providers))), return_exceptions=True)
+        try:
+            asyncio.run_coroutine_threadsafe(touch_all(), self._ensure_loop()).result(timeout)
+        except Exception as e:
+            print(f"LLM warm-up skipped: {e}")
+
     def _switch_provider(self):
         # switch between models inside the same profile (for hedging fallback)
         self.current_provider = (self.current_provider + 1) % len(self.api_providers)
@@ -90,58 +234,98 @@ class LLMHandler:
         self.client = self._create_client()
         return idx
 
-    def _is_quota_or_auth_error(self, exc_msg: str) -> bool:
-        m = exc_msg.lower()
-        if any(w in m for w in ["429", "too many requests", "rate"]): return True
-        if any(w in m for w in ["401", "403", "unauthorized", "forbidden", "invalid api key"]): return True
-        if "insufficient_quota" in m: return True
-        return False
+    _QUOTA_AUTH_RE = re.compile(
+        r"429|401|403|too many requests|rate|unauthorized|forbidden|invalid api key|insufficient_quota", re.I)
+
+    def _is_quota_or_auth_error(self, exc: Exception) -> bool:
+        import openai  # already loaded: only clients raise these
+        # The SDK's typed errors settle most cases without looking at the message
+        if isinstance(exc, (openai.RateLimitError, openai.AuthenticationError, openai.PermissionDeniedError)):
+            return True
+        if isinstance(exc, openai.APIStatusError) and exc.status_code in (401, 402, 403, 429):
+            return True
+        return self._QUOTA_AUTH_RE.search(str(exc)) is not None
 
     def _quota_message(self) -> str:
         label = self.key_manager.get_active_label()
         return (f"[API Notice] The current OpenRouter account “{label}” appears to be rate-limited or out of quota. "
                 f"Please click the API button at the top to switch profiles, then try again.")
 
+    def _build_messages(self, message, conversation_history=None, lesson_context=None):
+        lesson_key = None
+        if lesson_context:
+            lesson_key = tuple(lesson_context[f] for f in _LESSON_FIELDS)
+        recent = ()
+        if conversation_history:
+            # list() so a bounded deque works as well as a plain list
+            recent = tuple((m["role"], m["content"]) for m in list(conversation_history)[-4:])
+        return _cached_messages(lesson_key, recent, message)
+
+    def _compose_messages(self, message, conversation_history, lesson_context, messages):
+        """Messages supplied by the caller, else built from the message; shared by both reply paths"""
+        if messages is not None:
+            return messages
+        if message is None:
+            raise ValueError("Either message or messages must be provided")
+        return self._build_messages(message, conversation_history, lesson_context)
+
+    def _max_tokens_for(self, message=None, lesson_context=None):
+        if lesson_context:
+            return LESSON_MAX_TOKENS
+        if message is not None and len(message.split()) < SHORT_MESSAGE_WORDS:
+            return SHORT_MAX_TOKENS
+        return DEFAULT_MAX_TOKENS
+
+    # ---------- Reply cache ----------
+    def _cache_key(self, messages, max_tokens):
+        """Key for an exact repeat of this request, or None when it should not be cached"""
+        # system + history + user; anything past the threshold is conversation state
+        if len(messages) > _RESP_CACHE_MAX_HISTORY + 2:
+            return None
+        h = hashlib.blake2b(json.dumps(messages, sort_keys=True).encode("utf-8"), digest_size=16)
+        # Any provider in the profile may answer, so the key covers all of their models and settings
+        h.update(json.dumps([[p["model"], p["gen_params"]] for p in self.api_providers] + [max_tokens],
+                            sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _cache_get(self, key):
+        if key is None:
+            return None
+        reply = self._resp_cache.get(key)
+        if reply is not None:
+            self._resp_cache.move_to_end(key)
+        return reply
+
+    def _cache_put(self, key, reply):
+        if key is None or not reply:
+            return
+        self._resp_cache[key] = reply
+        self._resp_cache.move_to_end(key)
+        if len(self._resp_cache) > _RESP_CACHE_MAX:
+            self._resp_cache.popitem(last=False)
+
     # ---------- Blocking (legacy fallback) ----------
     def get_ai_response(self, message=None, conversation_history=None, lesson_context=None, messages=None):
-        if messages is None:
-            if message is None:
-                raise ValueError("Either message or messages must be provided")
-
-            if lesson_context:
-                system_msg = (
-                    f"You are Lingo teaching {lesson_context['student_name']} (Level: {lesson_context['student_level']}). "
-                    f"Current Lesson: {lesson_context['lesson_title']}\n"
-                    f"Objective: {lesson_context['lesson_objective']}\n"
-                    "Guidelines:\n"
-                    "1. Reference the lesson content\n"
-                    "2. Personalize explanations\n"
-                    "3. Keep responses focused and don't use any emoji and avoid '*' character.\n"
-                    "4. Keep responses short (<=2 sentences, <=60 words) and end with one short question.\n"
-                )
-            else:
-                system_msg = (
-                    "You are Lingo, a friendly AI English Teacher. "
-                    "Have natural conversations and help with general English questions. "
-                    "Keep responses <=2 sentences (<=60 words) and end with one short question. "
-                    "Avoid the '*' character."
-                )
+        messages = self._compose_messages(message, conversation_history, lesson_context, messages)
 
-            messages = [{"role": "system", "content": system_msg}]
-            if conversation_history:
-                messages.extend(conversation_history[-4:])
-            messages.append({"role": "user", "content": message})
+        max_tokens = self._max_tokens_for(message, lesson_context)
+        key = self._cache_key(messages, max_tokens)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
 
         p = self.api_providers[self.current_provider]
         try:
             resp = self.client.chat.completions.create(
                 model=p["model"], messages=messages,
-                max_tokens=DEFAULT_MAX_TOKENS, temperature=0.7, stop=DEFAULT_STOP
+                max_tokens=max_tokens, **p["gen_params"]
             )
-            return resp.choices[0].message.content.strip()
+            reply = resp.choices[0].message.content.strip()
+            self._cache_put(key, reply)
+            return reply
         except Exception as e:
             emsg = str(e)
-            if self._is_quota_or_auth_error(emsg):
+            if self._is_quota_or_auth_error(e):
                 return self._quota_message()
             print(f"Error with {p['name']}: {emsg}")
             self._switch_provider()
@@ -152,113 +336,178 @@ class LLMHandler:
         """
         Yields text chunks as they arrive.
         Races two providers; ONLY the first provider that emits a token continues streaming.
-        The loser is signaled to stop immediately.
+        The loser is cancelled immediately.
         On quota/auth/rate errors, yields a clear instruction to switch profile (no auto-switch).
         """
-        import time
-        import threading
-
-        # Build messages if not supplied
-        if messages is None:
-            if message is None:
-                raise ValueError("Either message or messages must be provided")
-
-            if lesson_context:
-                system_msg = (
-                    f"You are Lingo teaching {lesson_context['student_name']} (Level: {lesson_context['student_level']}). "
-                    f"Current Lesson: {lesson_context['lesson_title']}\n"
-                    f"Objective: {lesson_context['lesson_objective']}\n"
-                    "Guidelines:\n"
-                    "1. Reference the lesson content\n"
-                    "2. Personalize explanations\n"
-                    "3. Keep responses focused and don't use any emoji and avoid '*' character.\n"
-                    "4. Keep responses short (<=2 sentences, <=60 words) and end with one short question.\n"
-                )
-            else:
-                system_msg = (
-                    "You are Lingo, a friendly AI English Teacher. "
-                    "Keep responses <=2 sentences (<=60 words) and end with one short question. "
-                    "Avoid the '*' character."
-                )
-
-            messages = [{"role": "system", "content": system_msg}]
-            if conversation_history:
-                messages.extend(conversation_history[-4:])
-            messages.append({"role": "user", "content": message})
+        messages = self._compose_messages(message, conversation_history, lesson_context, messages)
+
+        max_tokens = self._max_tokens_for(message, lesson_context)
+        key = self._cache_key(messages, max_tokens)
+        cached = self._cache_get(key)
+        self.last_stream_complete = False
+        self.last_stream_reply = None
+        if cached is not None:
+            self.last_stream_complete = True
+            self.last_stream_reply = cached
+            yield cached
+            return
 
-        # Pick two providers to race
+        # The race itself runs on the background loop; None marks the end of the reply
+        out_q: queue.SimpleQueue = queue.SimpleQueue()
+        fut = asyncio.run_coroutine_threadsafe(self._race(messages, out_q, max_tokens), self._ensure_loop())
+        try:
+            while True:
+                item = out_q.get()
+                if item is None:
+                    break
+                yield item
+            # _race returns the winner's own text only when it streamed to the end without
+            # error; notices from a failed provider went to out_q but are not part of it
+            reply = fut.result()
+            self.last_stream_complete = reply is not None
+            self.last_stream_reply = reply
+            self._cache_put(key, reply)
+        finally:
+            fut.cancel()
+
+    def _pick_challenger(self, leader_idx):
+        """Provider to probe against the leader: one never measured, else the slowest on record"""
+        others = [i for i in range(len(self.api_providers)) if i != leader_idx]
+        unmeasured = [i for i in others if i not in self._ttfb_ewma]
+        if unmeasured:
+            return unmeasured[0]
+        return max(others, key=self._ttfb_ewma.get)
+
+    def _soft_timeout(self):
+        """Referee deadline: twice the recent p90 first-token time, capped at SOFT_TIMEOUT_SECONDS"""
+        p90 = None
+        if self._ttfb_samples:
+            ordered = sorted(self._ttfb_samples)
+            p90 = ordered[int(0.9 * (len(ordered) - 1))]
+        return min(SOFT_TIMEOUT_SECONDS, 2.0 * (p90 or 1.5))
+
+    async def _race(self, messages, out_q, max_tokens=DEFAULT_MAX_TOKENS):
+        # The last winner leads. Until it has a first-token history, and on every
+        # PROBE_EVERY-th message, it races a challenger from the start; otherwise the
+        # next provider is only a backup for a late or failed leader
         idx_a = self.current_provider
-        idx_b = (self.current_provider + 1) % len(self.api_providers)
+        self._probe_counter += 1
+        leader_ewma = self._ttfb_ewma.get(idx_a)
+        if leader_ewma is None or self._probe_counter % PROBE_EVERY == 0:
+            idx_b = self._pick_challenger(idx_a)
+            hedge_delay = 0.0
+        else:
+            idx_b = (idx_a + 1) % len(self.api_providers)
+            hedge_delay = max(HEDGE_DELAY_SECONDS, HEDGE_DELAY_FACTOR * leader_ewma)
+        soft_timeout = self._soft_timeout()
 
-        out_q: queue.Queue = queue.Queue()
-        winner_lock = threading.Lock()
         winner_idx = {"value": None}
-        stop_flags = {idx_a: threading.Event(), idx_b: threading.Event()}
-        sentinels_needed = 2
+        winner_event = asyncio.Event()  # set once winner_idx is decided
+        completed = {"value": False}  # the winner's stream ended normally
+        winner_parts = []  # content the winner sent to out_q; error notices stay out
+        first_event = {}  # provider idx -> seconds to its first SSE event of any kind
+        tasks = {}
 
-        def stream_from_provider(provider_idx: int):
+        async def stream_from_provider(provider_idx: int):
             p = self.api_providers[provider_idx]
-            def _open_stream():
-                client = self._create_client(provider_idx)
-                return client.chat.completions.create(
+            buf = []
+            stream = None
+            t_open = last_flush = time.monotonic()
+            try:
+                stream = await self._create_async_client(provider_idx).chat.completions.create(
                     model=p["model"],
                     messages=messages,
-                    max_tokens=DEFAULT_MAX_TOKENS,
-                    temperature=0.7,
-                    stop=DEFAULT_STOP,
-                    stream=True
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **p["gen_params"]
                 )
-            try:
-                stream = _open_stream()
-                for event in stream:
-                    if stop_flags[provider_idx].is_set():
-                        break
+                async for event in stream:
+                    if provider_idx not in first_event:
+                        first_event[provider_idx] = time.monotonic() - t_open
                     delta = getattr(event.choices[0].delta, "content", None)
                     if not delta:
                         continue
-                    with winner_lock:
-                        if winner_idx["value"] is None:
-                            winner_idx["value"] = provider_idx
-                            other_idx = idx_a if provider_idx == idx_b else idx_b
-                            stop_flags[other_idx].set()
-                        elif winner_idx["value"] != provider_idx:
-                            break
-                    out_q.put(delta)
+                    if winner_idx["value"] is None:
+                        winner_idx["value"] = provider_idx
+                        winner_event.set()
+                        if provider_idx != self.current_provider:
+                            self.current_provider = provider_idx
+                            self.client = self._create_client()
+                        other = tasks.get(idx_a if provider_idx == idx_b else idx_b)
+                        if other is not None:
+                            other.cancel()
+                        elapsed = time.monotonic() - t_open
+                        prev = self._ttfb_ewma.get(provider_idx)
+                        self._ttfb_ewma[provider_idx] = elapsed if prev is None else 0.8 * prev + 0.2 * elapsed
+                        self._ttfb_samples.append(elapsed)
+                        if _DEBUG:
+                            print(f"[race] {p['name']} won: first event {first_event[provider_idx]:.3f}s, "
+                                  f"first content {elapsed:.3f}s")
+                    elif winner_idx["value"] != provider_idx:
+                        break
+                    buf.append(delta)
+                    now = time.monotonic()
+                    if len(buf) >= STREAM_BATCH_CHUNKS or now - last_flush > STREAM_FLUSH_SECONDS:
+                        chunk = "".join(buf)
+                        out_q.put(chunk)
+                        winner_parts.append(chunk)
+                        buf.clear()
+                        last_flush = now
+                if winner_idx["value"] == provider_idx:
+                    completed["value"] = True
             except Exception as e:
                 emsg = str(e)
-                with winner_lock:
-                    if winner_idx["value"] is None:
-                        if self._is_quota_or_auth_error(emsg):
-                            out_q.put("\n" + self._quota_message())
-                        else:
-                            out_q.put(f"\n[Error: {p['name']} failed: {emsg}]")
-            finally:
-                out_q.put((provider_idx, None))
-
-        def soft_timeout_referee():
-            start = time.time()
-            while (time.time() - start) < SOFT_TIMEOUT_SECONDS:
-                with winner_lock:
-                    if winner_idx["value"] is not None:
-                        return
-                time.sleep(0.01)
-            with winner_lock:
                 if winner_idx["value"] is None:
-                    winner_idx["value"] = idx_a
-                    stop_flags[idx_b].set()
+                    if self._is_quota_or_auth_error(e):
+                        out_q.put("\n" + self._quota_message())
+                    else:
+                        out_q.put(f"\n[Error: {p['name']} failed: {emsg}]")
+            finally:
+                if buf:
+                    chunk = "".join(buf)
+                    out_q.put(chunk)
+                    winner_parts.append(chunk)
+                if stream is not None:
+                    # Close the HTTP response so a cancelled loser drops its connection
+                    # instead of leaving the provider generating into an unread socket
+                    try:
+                        await stream.close()
+                    except Exception:
+                        pass
+
+        async def soft_timeout_referee():
+            # Returns as soon as a winner is declared instead of sleeping out the deadline
+            try:
+                await asyncio.wait_for(winner_event.wait(), soft_timeout)
+                return
+            except asyncio.TimeoutError:
+                pass
+            # A leader that is connected but silent (role-only or empty chunks) is likely
+            # stuck, so the race stays open for whichever provider sends content first
+            if winner_idx["value"] is None and idx_a not in first_event:
+                winner_idx["value"] = idx_a
+                winner_event.set()
+                if idx_b in tasks:
+                    tasks[idx_b].cancel()
+
+        referee = asyncio.create_task(soft_timeout_referee())
+        try:
+            tasks[idx_a] = asyncio.create_task(stream_from_provider(idx_a))
 
-        ta = threading.Thread(target=stream_from_provider, args=(idx_a,), daemon=True)
-        tb = threading.Thread(target=stream_from_provider, args=(idx_b,), daemon=True)
-        tr = threading.Thread(target=soft_timeout_referee, daemon=True)
-        tr.start(); ta.start(); tb.start()
+            won = asyncio.create_task(winner_event.wait())
+            await asyncio.wait({tasks[idx_a], won}, timeout=hedge_delay,
+                               return_when=asyncio.FIRST_COMPLETED)
+            won.cancel()
+            if winner_idx["value"] is None:
+                tasks[idx_b] = asyncio.create_task(stream_from_provider(idx_b))
 
-        finished = 0
-        while finished < sentinels_needed:
-            item = out_q.get()
-            if isinstance(item, tuple) and item[1] is None:
-                finished += 1
-                continue
-            yield item
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            referee.cancel()
+            for t in tasks.values():
+                t.cancel()
+            out_q.put(None)
+        return "".join(winner_parts) if completed["value"] else None
 
 
 class MainAIChat:
@@ -273,22 +522,57 @@ class MainAIChat:
 
         # NEW: key manager + LLM wired together
         self.key_manager = KeyManager()
-        self.llm = LLMHandler(self.key_manager)
-
-        self.lesson_manager = LessonManager(llm_handler=self.llm)
-        self.student_manager = StudentManager(lesson_manager=self.lesson_manager)
+        # The LLM handler (and the OpenAI SDK import) is built after the first paint; see _warm_llm
+        self.llm = None
 
         self.current_lesson = None
-        self.conversation_history = []
+        # Only the last four turns reach the model; keep 4 user + 4 assistant messages
+        self.conversation_history = collections.deque(maxlen=8)
         self.login_window = None
         self.dashboard_window = None
 
+        # streaming state (set up first: display_message checks _streaming)
+        self._streaming = False
+        # One long-lived thread runs every reply; send_message only queues the job
+        self._stream_jobs: queue.Queue = queue.Queue()
+        # Chunks waiting for Tk; at most one drain is scheduled at a time
+        self._stream_pending = collections.deque()
+        self._drain_pending = threading.Event()
+        threading.Thread(target=self._run_stream_jobs, daemon=True).start()
+
+        self.semantic_cache = SemanticCache()
+
         self.create_widgets()
+        threading.Thread(target=self._warm_llm, daemon=True).start()
+        threading.Thread(target=self.semantic_cache.load, daemon=True).start()
 
-        # streaming plumbing
-        self._stream_queue: queue.Queue = queue.Queue()
-        self._stream_worker: threading.Thread | None = None
-        self._streaming = False
+    def _warm_llm(self):
+        try:
+            llm = LLMHandler(self.key_manager)
+        except Exception as e:
+            print(f"LLM init failed: {e}")
+            return
+        # Installed on the Tk thread, where the lesson_manager property is read, so a manager
+        # built concurrently can't miss the handler
+        self.root.after(0, self._install_llm, llm)
+        llm.warm_up()
+
+    def _install_llm(self, llm):
+        self.llm = llm
+        # A lesson manager built before this point was handed llm=None
+        lesson_manager = self.__dict__.get("lesson_manager")
+        if lesson_manager is not None:
+            lesson_manager.llm = llm
+
+    @functools.cached_property
+    def lesson_manager(self):
+        from lesson_manager import LessonManager
+        return LessonManager(llm_handler=self.llm)
+
+    @functools.cached_property
+    def student_manager(self):
+        from student_manager import StudentManager
+        return StudentManager(lesson_manager=self.lesson_manager)
 
     def show_dashboard(self):
         if self.dashboard_window and self.dashboard_window.winfo_exists():
@@ -345,6 +629,10 @@ class MainAIChat:
             insertbackground="#6c5ce7"
         )
         self.chat_display.pack(fill=tk.BOTH, expand=True)
+        # Tags are configured once here; inserts just reference them
+        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
+        self.chat_display.tag_config("user", foreground="#00b894", font=("Segoe UI", 12, "bold"))
+        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
 
         input_frame = ttk.Frame(main_frame, style="Input.TFrame")
         input_frame.pack(fill=tk.X)
@@ -359,6 +647,8 @@ class MainAIChat:
         self.display_message("Lingo", "Hello! I'm Lingo, your AI English Teacher. How can I help you today?")
 
     def _cycle_profile(self):
+        if self.llm is None:
+            return
         idx = self.llm.next_profile()
         label = self.key_manager.get_active_label()
         self.profile_btn.config(text=f"API: {label}")
@@ -366,38 +656,46 @@ class MainAIChat:
 
     def display_message(self, sender, message):
         self.chat_display.configure(state='normal')
-        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("user", foreground="#00b894", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
         self.chat_display.insert(tk.END, f"{sender}: ", "ai" if sender == "Lingo" else "user")
         self.chat_display.insert(tk.END, f"{message}\n\n", "message")
         self.chat_display.see(tk.END)
-        self.chat_display.configure(state='disabled')
+        # A reply still streaming needs the widget writable
+        if not self._streaming:
+            self.chat_display.configure(state='disabled')
 
     def _append_stream_text(self, text: str):
-        self.chat_display.configure(state='normal')
+        # The widget stays 'normal' for the whole stream; see send_message/_finish_stream
         self.chat_display.insert(tk.END, text, "message")
         self.chat_display.see(tk.END)
-        self.chat_display.configure(state='disabled')
 
-    def _drain_stream_queue(self):
-        try:
-            while True:
-                chunk = self._stream_queue.get_nowait()
-                if chunk is None:
-                    self._streaming = False
-                    self._append_stream_text("\n\n")
-                    self.root.config(cursor="")
-                    return
-                self._append_stream_text(chunk)
-        except queue.Empty:
-            pass
-        if self._streaming:
-            self.root.after(15, self._drain_stream_queue)
+    def _post_stream_text(self, text: str):
+        """Worker side: queue text and wake Tk once, however many chunks land before it runs"""
+        self._stream_pending.append(text)
+        if not self._drain_pending.is_set():
+            self._drain_pending.set()
+            self.root.after_idle(self._drain_stream_text)
+
+    def _drain_stream_text(self):
+        # Clear first so a chunk appended while draining schedules the next drain
+        self._drain_pending.clear()
+        parts = []
+        while self._stream_pending:
+            parts.append(self._stream_pending.popleft())
+        if parts:
+            self._append_stream_text("".join(parts))
+
+    def _finish_stream(self):
+        self._streaming = False
+        self._append_stream_text("\n\n")
+        self.chat_display.configure(state='disabled')
+        self.root.config(cursor="")
 
     def send_message(self, event=None):
         if self._streaming:
             return
+        if self.llm is None:
+            self.display_message("Lingo", "I'm still starting up. Please try again in a moment.")
+            return
 
         message = self.user_input.get().strip()
         if not message:
@@ -415,7 +713,7 @@ class MainAIChat:
             return
 
         lesson_context = None
-        if getattr(self.student_manager, "current_user", None) and self.current_lesson:
+        if self.current_lesson and getattr(self.student_manager, "current_user", None):
             lesson_context = {
                 "student_name": self.student_manager.current_user["name"],
                 "student_level": self.student_manager.current_user["level"],
@@ -427,45 +725,69 @@ class MainAIChat:
         self.root.config(cursor="watch")
 
         self.chat_display.configure(state='normal')
-        self.chat_display.tag_config("ai", foreground="#6c5ce7", font=("Segoe UI", 12, "bold"))
-        self.chat_display.tag_config("message", font=("Segoe UI", 12), lmargin1=20, lmargin2=20, spacing3=5)
         self.chat_display.insert(tk.END, "Lingo: ", "ai")
-        self.chat_display.configure(state='disabled')
         self.chat_display.see(tk.END)
 
+        # Early general-chat turns: a paraphrase of something already answered is served locally.
+        # History excludes the message just appended
+        use_semantic = (not self.current_lesson
+                        and len(self.conversation_history) - 1 <= SEMANTIC_CACHE_MAX_HISTORY)
+
+        # Chunks arrive already batched by the LLM handler and are coalesced again per Tk wake-up
         def worker():
             try:
+                # The embedding runs here rather than on the Tk thread
+                cached = self.semantic_cache.lookup(message) if use_semantic else None
+                if cached:
+                    self._post_stream_text(cached)
+                    self.conversation_history.append({"role": "assistant", "content": cached})
+                    return
                 for chunk in self.llm.stream_ai_response(
                     message=message,
                     conversation_history=self.conversation_history,
                     lesson_context=lesson_context
                 ):
-                    self._stream_queue.put(chunk)
-                self._stream_queue.put(None)
+                    self._post_stream_text(chunk)
+                # Only the winning provider's complete text; never a quota or error notice
+                reply = self.llm.last_stream_reply
+                if use_semantic and reply:
+                    self.semantic_cache.add(message, reply.strip())
             except Exception as e:
-                self._stream_queue.put(f"\n[Error: {e}]")
-                self._stream_queue.put(None)
-
-        threading.Thread(target=worker, daemon=True).start()
-        self.root.after(15, self._drain_stream_queue)
+                self._post_stream_text(f"\n[Error: {e}]")
+            finally:
+                self.root.after_idle(self._finish_stream)
+
+        self._stream_jobs.put(worker)
+
+    def _run_stream_jobs(self):
+        while True:
+            self._stream_jobs.get()()
+
+    # One pass over the message; word boundaries keep "hi" from matching inside "this"
+    _SIMPLE_RE = re.compile(r"\b(hello|hi|hey|how are you|how's it going|bye|goodbye|see you|time|date)\b")
+    _SIMPLE_REPLIES = {
+        "greeting": lambda: random.choice([
+            "Hello there! How can I help you today?",
+            "Hi! What would you like to know?",
+            "Greetings! What's on your mind?"
+        ]),
+        "how": lambda: "I'm doing well and ready to help! How are you?",
+        "bye": lambda: "Goodbye! Feel free to come back if you have more questions.",
+        "time": lambda: f"The current time is {datetime.now().strftime('%H:%M')}.",
+        "date": lambda: f"Today's date is {datetime.now().strftime('%Y-%m-%d')}.",
+    }
+    _SIMPLE_KINDS = {
+        "hello": "greeting", "hi": "greeting", "hey": "greeting",
+        "how are you": "how", "how's it going": "how",
+        "bye": "bye", "goodbye": "bye", "see you": "bye",
+        "time": "time", "date": "date",
+    }
 
     def get_simple_response(self, message):
-        import random
-        if any(word in message for word in ["hello", "hi", "hey"]):
-            return random.choice([
-                "Hello there! How can I help you today?",
-                "Hi! What would you like to know?",
-                "Greetings! What's on your mind?"
-            ])
-        elif any(word in message for word in ["how are you", "how's it going"]):
-            return "I'm doing well and ready to help! How are you?"
-        elif any(word in message for word in ["bye", "goodbye", "see you"]):
-            return "Goodbye! Feel free to come back if you have more questions."
-        elif "time" in message:
-            return f"The current time is {datetime.now().strftime('%H:%M')}."
-        elif "date" in message:
-            return f"Today's date is {datetime.now().strftime('%Y-%m-%d')}."
-        return None
+        m = self._SIMPLE_RE.search(message)
+        if not m:
+            return None
+        return self._SIMPLE_REPLIES[self._SIMPLE_KINDS[m.group(1)]]()
 
     def open_login(self):
         if self.login_window and self.login_window.winfo_exists():
@@ -473,6 +795,7 @@ class MainAIChat:
             return
         self.login_window = tk.Toplevel(self.root)
         self.login_window.protocol("WM_DELETE_WINDOW", self.on_login_close)
+        from login import LoginScreen
         LoginScreen(self.login_window, self)
         self.login_window.geometry("400x300")
         self.login_window.transient(self.root)
@@ -494,3 +817,4 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = MainAIChat(root)
     root.mainloop()
+    app.semantic_cache.save()
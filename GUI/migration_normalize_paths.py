@@ -1,5 +1,11 @@
 import os
 import json
+import shutil
+import tempfile
+try:
+    import ijson  # optional: stream entries one at a time instead of loading the whole file
+except ImportError:
+    ijson = None
 
 # Path to your lessons_progress.json
 PROGRESS_FILE = os.path.join(
@@ -7,36 +13,59 @@ PROGRESS_FILE = os.path.join(
     "lessons_progress.json"
 )
 
+_DECODE_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson else ())
+
+def _iter_entries(f):
+    if ijson is not None:
+        yield from ijson.items(f, "item", use_float=True)
+    else:
+        yield from json.load(f)
+
 def normalize_filepaths():
     if not os.path.exists(PROGRESS_FILE):
         print("❌ lessons_progress.json not found.")
         return
-    
-    with open(PROGRESS_FILE, "r", encoding="utf-8") as f:
-        try:
-            data = json.load(f)
-        except json.JSONDecodeError:
-            print("❌ Error: lessons_progress.json is corrupted.")
-            return
 
-    if not isinstance(data, list):
-        print("❌ Unexpected file format.")
-        return
-    
     updated = False
-    for entry in data:
-        if "filepath" in entry:
-            abs_path = os.path.abspath(entry["filepath"])
-            if entry["filepath"] != abs_path:
-                entry["filepath"] = abs_path
-                updated = True
-    
-    if updated:
-        with open(PROGRESS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        print("✅ All filepaths normalized to absolute paths.")
-    else:
-        print("ℹ No changes were necessary. All filepaths already normalized.")
+    # Write next to the original so the final os.replace is an atomic rename on the same filesystem
+    tmp = tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8", suffix=".tmp",
+                                      dir=os.path.dirname(PROGRESS_FILE))
+    try:
+        with open(PROGRESS_FILE, "r", encoding="utf-8") as f, tmp:
+            if not f.read(64).lstrip().startswith("["):
+                print("❌ Unexpected file format.")
+                return
+            f.seek(0)
+            tmp.write("[\n")
+            # Relative paths are resolved against the CWD, as os.path.abspath would; reading it
+            # once saves a getcwd() call per entry
+            cwd = os.getcwd()
+            try:
+                for i, entry in enumerate(_iter_entries(f)):
+                    fp = entry.get("filepath")
+                    if fp:
+                        abs_path = os.path.normpath(fp if os.path.isabs(fp) else os.path.join(cwd, fp))
+                        if fp != abs_path:
+                            entry["filepath"] = abs_path
+                            updated = True
+                    if i:
+                        tmp.write(",\n")
+                    json.dump(entry, tmp, ensure_ascii=False)
+            except _DECODE_ERRORS:
+                print("❌ Error: lessons_progress.json is corrupted.")
+                return
+            tmp.write("\n]\n")
+
+        if updated:
+            shutil.copymode(PROGRESS_FILE, tmp.name)  # temp files are created 0600
+            os.replace(tmp.name, PROGRESS_FILE)
+            print("✅ All filepaths normalized to absolute paths.")
+        else:
+            print("ℹ No changes were necessary. All filepaths already normalized.")
+    finally:
+        # Left behind on every path except a successful replace
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
 
 if __name__ == "__main__":
     normalize_filepaths()
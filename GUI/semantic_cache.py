@@ -0,0 +1,110 @@
+# semantic_cache.py
+import os
+import threading
+
+# numpy and sentence_transformers (which pulls in torch) are imported in load(), off the UI thread;
+# without sentence-transformers installed the cache just stays off
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.92
+CACHE_PATH = os.path.expanduser("~/.lingo_cache.npz")
+MAX_LEARNED = 1000  # oldest learned pairs are dropped past this; bounds the index and the file
+
+# Small talk answered without the LLM, whatever the wording
+CANNED = [
+    ("hello", "Hello there! How can I help you today?"),
+    ("hi there", "Hello there! How can I help you today?"),
+    ("hey, what's up?", "Hi! What would you like to know?"),
+    ("good morning", "Good morning! What would you like to practise today?"),
+    ("good evening", "Good evening! What would you like to practise today?"),
+    ("how are you?", "I'm doing well and ready to help! How are you?"),
+    ("how are you doing today?", "I'm doing well and ready to help! How are you?"),
+    ("how's it going?", "I'm doing well and ready to help! How are you?"),
+    ("goodbye", "Goodbye! Feel free to come back if you have more questions."),
+    ("see you later", "Goodbye! Feel free to come back if you have more questions."),
+    ("thank you very much", "You're welcome! Is there anything else you'd like to practise?"),
+]
+
+
+class SemanticCache:
+    """Maps a user message to a stored reply when a known prompt means the same thing"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._model = None
+        self._encode_lock = threading.Lock()
+        # (normalized embeddings (N, 384), replies); swapped as one tuple so readers never see half an update
+        self._index = None
+        self._learned = []  # (embedding, reply) pairs added this session or loaded from disk
+        self.ready = False  # set once load() has finished; lookup() answers None until then
+
+    def load(self):
+        """Load the model and embed the canned prompts; slow, so call it off the UI thread"""
+        try:
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            print(f"Semantic cache disabled: {e}")
+            return False
+        try:
+            self._model = SentenceTransformer(MODEL_NAME, device="cpu")
+            prompts = [p for p, _ in CANNED]
+            replies = [r for _, r in CANNED]
+            mat = self._encode(prompts)
+            if os.path.exists(self.path):
+                with np.load(self.path, allow_pickle=False) as data:
+                    emb = data["embeddings"][-MAX_LEARNED:]
+                    saved = [str(r) for r in data["replies"][-MAX_LEARNED:]]
+                self._learned = list(zip(emb, saved))
+                mat = np.vstack([mat, emb])
+                replies += saved
+        except Exception as e:
+            print(f"Semantic cache disabled: {e}")
+            self._model = None
+            return False
+        self._index = (mat, replies)
+        self.ready = True
+        return True
+
+    def _encode(self, texts):
+        with self._encode_lock:
+            return self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    def lookup(self, message):
+        """Stored reply for a message close enough to a known prompt, else None"""
+        if not self.ready:
+            return None
+        import numpy as np
+        mat, replies = self._index
+        sims = mat @ self._encode([message])[0]
+        best = int(np.argmax(sims))
+        if sims[best] > SIMILARITY_THRESHOLD:
+            return replies[best]
+        return None
+
+    def add(self, message, reply):
+        if not self.ready or not reply:
+            return
+        import numpy as np
+        index = self._index
+        emb = self._encode([message])[0]
+        mat, replies = index
+        self._learned.append((emb, reply))
+        if len(self._learned) > MAX_LEARNED:
+            # Learned rows follow the canned ones; drop the oldest
+            del self._learned[0]
+            n = len(CANNED)
+            mat = np.delete(mat, n, axis=0)
+            replies = replies[:n] + replies[n + 1:]
+        self._index = (np.vstack([mat, emb]), replies + [reply])
+
+    def save(self):
+        """Write the learned pairs to disk; the canned ones are re-embedded on load"""
+        if not self._learned:
+            return
+        import numpy as np
+        try:
+            np.savez(self.path,
+                     embeddings=np.stack([e for e, _ in self._learned]),
+                     replies=np.array([r for _, r in self._learned]))
+        except OSError as e:
+            print(f"Could not save semantic cache: {e}")